@@ -7,6 +7,7 @@ from typing import List, Optional, Tuple
 
 import streamlit as st
 
+from core.changes import LEGACY_CHAT_FIELD
 from core.storage import new_id, normalize_data, save_db
 
 UPLOAD_FOLDER = "uploads"
@@ -83,7 +84,9 @@ def _play_notification_sound() -> None:
 
 def _ensure_trip_structures(trip: dict) -> None:
     messages = trip.get("messages") if isinstance(trip.get("messages"), list) else []
-    chat = trip.get("chat") if isinstance(trip.get("chat"), list) else []
+    # Altbestände (Formatversion 1) können Nachrichten zusätzlich unter "chat" führen.
+    chat = trip.pop(LEGACY_CHAT_FIELD, None)
+    chat = chat if isinstance(chat, list) else []
     merged = []
     seen = set()
     for src in (messages, chat):
@@ -95,7 +98,6 @@ def _ensure_trip_structures(trip: dict) -> None:
             seen.add(marker)
             merged.append(msg)
     trip["messages"] = merged
-    trip["chat"] = merged
     if "typing" not in trip or not isinstance(trip["typing"], dict):
         trip["typing"] = {}
     if "presence" not in trip or not isinstance(trip["presence"], dict):
@@ -355,7 +357,6 @@ def render_chat(data: dict, trip_name: str, user: str) -> None:
                     os.remove(to_delete_msg["file"])
             except Exception:
                 pass
-            trip["chat"] = trip["messages"]
             normalize_data(data)
             save_db(data)
             st.session_state.force_reload = True
@@ -419,7 +420,6 @@ def chat_input(data: dict, trip_name: str, user: str) -> None:
                 "reactions": {},
             }
             trip["messages"].append(new_msg)
-            trip["chat"] = trip["messages"]
             trip["presence"][user] = time.time()
             normalize_data(data)
             save_db(data)
@@ -0,0 +1,201 @@
+"""Kleiner Event-Dienst für Live-Updates per Server-Sent Events.
+
+Start im selben Container neben Streamlit::
+
+    EVENTS_TOKEN=<Geheimnis> python -m app.event_sidecar --port 8765
+
+Ohne ``--host`` lauscht der Dienst nur auf 127.0.0.1. ``POST /publish`` mit
+``{"trip": ..., "version": ..., "origin": ...}`` verteilt ein Ereignis an alle
+offenen ``GET /events?trip=...``-Verbindungen dieser Reise; angenommen wird es
+nur von localhost und mit dem ``EVENTS_TOKEN`` im Header ``X-Events-Token``.
+Die App meldet jedes Speichern über :func:`install_publisher`.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import threading
+import urllib.parse
+import urllib.request
+
+from core.config import EVENTS_TOKEN
+
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 32
+TOKEN_HEADER = "X-Events-Token"
+
+
+class EventHub:
+    """Verteilt Ereignisse an die Abonnenten einer Reise."""
+
+    def __init__(self):
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+
+    def subscribe(self, trip_key: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers.setdefault(trip_key, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, trip_key: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(trip_key)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[trip_key]
+
+    def publish(self, event: dict) -> int:
+        queues = self._subscribers.get(str(event.get("trip") or ""), set())
+        for queue in queues:
+            if queue.full():
+                # Langsamer Client: nur das neueste Ereignis zählt.
+                queue.get_nowait()
+            queue.put_nowait(event)
+        return len(queues)
+
+
+def _is_local(writer: asyncio.StreamWriter) -> bool:
+    peer = writer.get_extra_info("peername")
+    try:
+        return ipaddress.ip_address(peer[0]).is_loopback
+    except (TypeError, ValueError, IndexError):
+        return False
+
+
+def _authorized(headers: dict, token: str) -> bool:
+    sent = headers.get(TOKEN_HEADER.lower(), "")
+    return bool(token) and hmac.compare_digest(sent.encode("utf-8"), token.encode("utf-8"))
+
+
+async def _respond(writer: asyncio.StreamWriter, status: str, body: bytes = b"") -> None:
+    writer.write(
+        f"HTTP/1.1 {status}\r\nContent-Length: {len(body)}\r\n"
+        "Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+
+
+async def _stream(hub: EventHub, trip_key: str, writer: asyncio.StreamWriter) -> None:
+    queue = hub.subscribe(trip_key)
+    try:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+            b"Access-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\n"
+            b"retry: 3000\n\n"
+        )
+        await writer.drain()
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                writer.write(b": ping\n\n")
+            else:
+                writer.write(f"event: trip\ndata: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            await writer.drain()
+    finally:
+        hub.unsubscribe(trip_key, queue)
+
+
+async def _handle(hub: EventHub, token: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = (await reader.readline()).decode("latin-1").split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if len(request_line) < 2:
+            return
+        method, target = request_line[0], urllib.parse.urlsplit(request_line[1])
+        if method == "GET" and target.path == "/events":
+            trip_key = urllib.parse.parse_qs(target.query).get("trip", [""])[0]
+            if not trip_key:
+                await _respond(writer, "400 Bad Request")
+                return
+            await _stream(hub, trip_key, writer)
+        elif method == "POST" and target.path == "/publish":
+            if not _is_local(writer) or not _authorized(headers, token):
+                await _respond(writer, "403 Forbidden")
+                return
+            body = await reader.readexactly(int(headers.get("content-length") or 0))
+            try:
+                event = json.loads(body or b"{}")
+            except ValueError:
+                await _respond(writer, "400 Bad Request")
+                return
+            await _respond(writer, "200 OK", str(hub.publish(event)).encode("ascii"))
+        else:
+            await _respond(writer, "404 Not Found")
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host: str, port: int, token: str) -> None:
+    hub = EventHub()
+    server = await asyncio.start_server(lambda r, w: _handle(hub, token, r, w), host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def session_tag() -> str | None:
+    """Kennung der Streamlit-Sitzung des laufenden Skripts, falls vorhanden.
+
+    Gehasht, weil Ereignisse an alle Abonnenten einer Reise gehen.
+    """
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except Exception:
+        return None
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return hashlib.sha256(ctx.session_id.encode("utf-8")).hexdigest()[:16] if ctx is not None else None
+
+
+def install_publisher(url: str, token: str) -> None:
+    """Meldet jedes Speichern einer Reise an den Event-Dienst unter ``url``.
+
+    Gesendet wird in einem Hintergrund-Thread; ist der Dienst nicht erreichbar,
+    geht das Ereignis verloren und save_db läuft unverändert weiter.
+    """
+    from core import storage
+    from core.changes import trip_version
+
+    endpoint = url.rstrip("/") + "/publish"
+
+    def _post(body: bytes) -> None:
+        request = urllib.request.Request(endpoint, data=body, headers={"Content-Type": "application/json", TOKEN_HEADER: token})
+        try:
+            urllib.request.urlopen(request, timeout=2).close()
+        except Exception:
+            pass
+
+    def _publish(trip_key: str, trip: dict | None) -> None:
+        event = {"trip": trip_key, "version": trip_version(trip) if trip else None, "origin": session_tag()}
+        body = json.dumps(event).encode("utf-8")
+        threading.Thread(target=_post, args=(body,), name="event-publish", daemon=True).start()
+
+    storage.subscribe(_publish)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.event_sidecar", description="Live-Updates per SSE verteilen")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+    if not EVENTS_TOKEN:
+        parser.error("EVENTS_TOKEN ist nicht gesetzt; ohne Token nimmt der Dienst keine Meldungen an.")
+    try:
+        asyncio.run(serve(args.host, args.port, EVENTS_TOKEN))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
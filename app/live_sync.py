@@ -1,10 +1,31 @@
+import os
+
 import streamlit as st
-import time
+import streamlit.components.v1 as components
+
+from app.event_sidecar import install_publisher, session_tag
+from core.changes import trip_version
+from core.config import EVENTS_PUBLISH_URL, EVENTS_TOKEN, EVENTS_URL
+from core.storage import changes_since
+from ui.fragments import shown_version
+
+if EVENTS_URL and EVENTS_TOKEN:
+    install_publisher(EVENTS_PUBLISH_URL, EVENTS_TOKEN)
+    _live_events = components.declare_component(
+        "live_events",
+        path=os.path.join(os.path.dirname(__file__), "components", "live_events"),
+    )
+else:
+    _live_events = None
 
-def auto_refresh(interval: int = 5):
-    """Einfaches Live-Refresh.
-    Wichtig: setzt force_reload=True, damit die App beim nächsten Run wirklich wieder load_db() zieht
-    (und nicht nur den Session-State weiter nutzt).
+
+def auto_refresh(trip_key: str, trip: dict, interval: int = 5):
+    """Live-Refresh für die angezeigte Reise.
+
+    Mit ``EVENTS_URL`` und ``EVENTS_TOKEN`` meldet eine unsichtbare Komponente per Server-Sent
+    Events, sobald eine neuere Version der Reise gespeichert wurde; erst dann
+    läuft die App neu. Ohne Event-Dienst fragt alle ``interval`` Sekunden ein
+    kleines Fragment per ``changes_since`` nach.
     """
     if "auto_refresh_enabled" not in st.session_state:
         st.session_state.auto_refresh_enabled = True
@@ -15,12 +36,24 @@ def auto_refresh(interval: int = 5):
     if not enabled:
         return
 
-    now = time.time()
-    if "last_refresh" not in st.session_state:
-        st.session_state.last_refresh = now
+    if _live_events is not None:
+        # Der Rückgabewert ist egal, eine Wertänderung löst den neuen Lauf aus.
+        _live_events(
+            url=EVENTS_URL,
+            trip=trip_key,
+            version=trip_version(trip),
+            session=session_tag(),
+            key=f"live_events_{trip_key}",
+            default=None,
+        )
         return
 
-    if now - st.session_state.last_refresh >= interval:
-        st.session_state.last_refresh = now
-        st.session_state.force_reload = True
-        st.rerun()
+    @st.fragment(run_every=interval)
+    def _poll():
+        # Panels laden und speichern ihren eigenen Stand; was sie zuletzt
+        # gezeigt haben, enthält auch die eigenen Änderungen.
+        cursor = max(trip_version(trip), shown_version(trip_key))
+        if changes_since(trip_key, cursor)["cursor"] != cursor:
+            st.rerun()
+
+    _poll()
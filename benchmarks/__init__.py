@@ -0,0 +1,4 @@
+"""Benchmarks für die Speicherfunktionen aus ``core.storage``.
+
+Aufruf: ``python -m benchmarks --trips 5 --messages 2000 --tasks 200 --photos 20``.
+"""
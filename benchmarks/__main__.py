@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from copy import deepcopy
+
+from benchmarks.generator import generate_db
+from core import storage
+from core.fileio import write_data_atomic
+
+MODES = ("json", "journal", "sharded", "sqlite")
+USER = "Anna"
+
+
+def _configure(mode: str, directory: str, source_file: str) -> None:
+    db_file = os.path.join(directory, "reisen_daten.json")
+    if mode == "sqlite":
+        storage.DB_FILE = "sqlite:///" + os.path.join(directory, "reisen.db")
+        storage.SQLITE_IMPORT_FILE = source_file
+    else:
+        storage.DB_FILE = db_file
+        if not os.path.exists(db_file):
+            with open(source_file, "rb") as src, open(db_file, "wb") as dst:
+                dst.write(src.read())
+    storage.STORAGE_MODE = mode
+    storage.SHARD_DIR = os.path.join(directory, "trips")
+
+
+def _cold() -> None:
+    """Verwirft Store und Cache, als wäre der Prozess neu gestartet."""
+    storage._store = None
+    storage._invalidate_cache()
+
+
+def _load_all() -> dict:
+    data = storage.load_db()
+    for trip_key in data["trips"]:
+        data["trips"][trip_key]
+    return data
+
+
+def _access_trip(trip_key: str) -> dict:
+    """Was jeder Streamlit-Lauf tut: load_db und die angezeigte Reise holen."""
+    return storage.load_db()["trips"][trip_key]
+
+
+def _measure(name: str, func, setup, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        func(arg)
+        timings.append(time.perf_counter() - start)
+
+    arg = setup()
+    tracemalloc.start()
+    try:
+        func(arg)
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(timings)
+    return {
+        "name": name,
+        "runs": repeat,
+        "min_s": round(min(timings), 6),
+        "median_s": round(median, 6),
+        "ops_per_s": round(1 / median, 2) if median else None,
+        "peak_mem_kb": round(peak / 1024, 1),
+    }
+
+
+def _append_message(data: dict) -> None:
+    trip = data["trips"][next(iter(data["trips"]))]
+    trip["messages"].append({"id": storage.new_id("msg"), "author": USER, "text": "Benchmark"})
+    storage.save_db(data)
+
+
+def _unread_counts(data: dict, counter) -> None:
+    for trip_key in data["trips"]:
+        counter(data["trips"][trip_key], USER)
+
+
+def run_mode(mode: str, source_file: str, legacy_doc: dict, repeat: int) -> list[dict]:
+    results = []
+    with tempfile.TemporaryDirectory(prefix=f"bench-{mode}-") as directory:
+        _configure(mode, directory, source_file)
+        _cold()
+        # Einmalige Übernahme der Quelldatei (Shards/SQLite) gehört nicht zur Messung.
+        _load_all()
+        results.append(_measure("load_db_cold", lambda _: _load_all(), _cold, repeat))
+        results.append(_measure("load_db_warm", lambda _: _load_all(), lambda: None, repeat))
+        trip_key = next(iter(storage.load_db()["trips"]))
+        trip_json = json.dumps(_access_trip(trip_key), ensure_ascii=False)
+        results.append(_measure("trip_access_warm", lambda _: _access_trip(trip_key), lambda: None, repeat))
+        # Vergleich: dieselbe Reise nur aus JSON zu lesen, ohne Normalisierung.
+        results.append(_measure("trip_json_parse", json.loads, lambda: trip_json, repeat))
+        results.append(_measure("normalize_data", storage.normalize_data, lambda: deepcopy(legacy_doc), repeat))
+        results.append(_measure("save_db_append_message", _append_message, _load_all, repeat))
+        results.append(_measure("save_db_unchanged", storage.save_db, _load_all, repeat))
+        results.append(_measure(
+            "get_chat_unread_count",
+            lambda data: _unread_counts(data, storage.get_chat_unread_count),
+            _load_all,
+            repeat,
+        ))
+        results.append(_measure(
+            "get_checklist_unread_count",
+            lambda data: _unread_counts(data, storage.get_checklist_unread_count),
+            _load_all,
+            repeat,
+        ))
+        _cold()
+    for result in results:
+        result["mode"] = mode
+    return results
+
+
+def check_results(results: list[dict]) -> list[str]:
+    """Modi, in denen der Zugriff auf eine gecachte Reise langsamer ist als JSON-Parsen."""
+    # Bestwerte statt Median: auf geteilten Maschinen schwanken einzelne Läufe stark.
+    best = {(result["mode"], result["name"]): result["min_s"] for result in results}
+    return [
+        f"{mode}: trip_access_warm {best[(mode, 'trip_access_warm')]}s >= trip_json_parse {best[(mode, 'trip_json_parse')]}s"
+        for mode in dict.fromkeys(result["mode"] for result in results)
+        if best[(mode, "trip_access_warm")] >= best[(mode, "trip_json_parse")]
+    ]
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+    except Exception:
+        return None
+    return out.stdout.strip() or None
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Speicherfunktionen messen")
+    parser.add_argument("--trips", type=int, default=5)
+    parser.add_argument("--messages", type=int, default=1000, help="Nachrichten pro Reise")
+    parser.add_argument("--tasks", type=int, default=100, help="Aufgaben pro Reise")
+    parser.add_argument("--photos", type=int, default=10, help="Fotos pro Reise")
+    parser.add_argument("--photo-bytes", type=int, default=30_000, help="Größe eines Fotos vor base64")
+    parser.add_argument("--legacy-ratio", type=float, default=0.3, help="Anteil der Reisen im alten Format")
+    parser.add_argument("--modes", default=",".join(MODES), help="kommagetrennt: " + ", ".join(MODES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON-Ergebnis in diese Datei statt auf stdout")
+    parser.add_argument("--check", action="store_true", help="Exit-Code 1, wenn der Cache langsamer ist als JSON-Parsen")
+    args = parser.parse_args(argv)
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unbekannte Modi: {', '.join(unknown)}")
+
+    legacy_doc = generate_db(
+        args.trips, args.messages, args.tasks, args.photos,
+        photo_bytes=args.photo_bytes, legacy_ratio=args.legacy_ratio, seed=args.seed,
+    )
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-source-") as directory:
+        source_file = os.path.join(directory, "reisen_daten.json")
+        # Wie vom alten save_db geschrieben: eingerücktes JSON.
+        write_data_atomic(source_file, legacy_doc, codec="json-pretty", compression="none")
+        source_size = os.path.getsize(source_file)
+        for mode in modes:
+            results.extend(run_mode(mode, source_file, legacy_doc, args.repeat))
+
+    report = {
+        "params": {key: value for key, value in vars(args).items() if key != "output"},
+        "source_file_bytes": source_size,
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    out = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+    else:
+        sys.stdout.write(out + "\n")
+    if args.check:
+        failures = check_results(results)
+        for failure in failures:
+            sys.stderr.write(failure + "\n")
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
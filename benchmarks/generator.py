@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import base64
+import datetime
+import random
+
+AUTHORS = ["Anna", "Ben", "Clara", "David", "Eva", "Felix"]
+CATEGORIES = ["Essen", "Ausrüstung", "Kleidung", "Sonstiges"]
+WORDS = "wir treffen uns morgen am see zelt grill wetter sonne regen auto bahn snacks wasser karte".split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _message(rng: random.Random, idx: int, ts: datetime.datetime, legacy: bool) -> dict:
+    author = rng.choice(AUTHORS)
+    reactions = {"👍": rng.sample(AUTHORS, rng.randint(1, 3))} if rng.random() < 0.2 else {}
+    if legacy:
+        # Ältere Einträge: andere Schlüssel, keine ID, Zeitstempel unter "timestamp".
+        return {
+            "sender": author,
+            "message": _text(rng, rng.randint(3, 20)),
+            "timestamp": ts.isoformat(timespec="seconds"),
+            "reactions": reactions,
+        }
+    return {
+        "id": f"msg_{idx:08d}",
+        "author": author,
+        "user": author,
+        "text": _text(rng, rng.randint(3, 20)),
+        "time": ts.isoformat(timespec="seconds"),
+        "created_at": ts.isoformat(timespec="seconds"),
+        "read_by": rng.sample(AUTHORS, rng.randint(0, len(AUTHORS))),
+        "reactions": reactions,
+        "pinned": rng.random() < 0.01,
+    }
+
+
+def _task(rng: random.Random, idx: int, ts: datetime.datetime, legacy: bool) -> dict:
+    if legacy:
+        return {"item": _text(rng, 2), "checked": rng.random() < 0.5}
+    author = rng.choice(AUTHORS)
+    return {
+        "id": f"task_{idx:06d}",
+        "text": _text(rng, 3),
+        "assignees": rng.sample(AUTHORS, rng.randint(0, 2)),
+        "category": rng.choice(CATEGORIES),
+        "done": rng.random() < 0.5,
+        "created_at": ts.isoformat(timespec="seconds"),
+        "created_by": author,
+        "updated_at": ts.isoformat(timespec="seconds"),
+        "updated_by": author,
+    }
+
+
+def _photo(rng: random.Random, idx: int, ts: datetime.datetime, photo_bytes: int) -> dict:
+    return {
+        "id": f"img_{idx:06d}",
+        "data": base64.b64encode(rng.randbytes(photo_bytes)).decode(),
+        "caption": _text(rng, 2) if rng.random() < 0.3 else "",
+        "date": ts.strftime("%d.%m.%Y %H:%M"),
+    }
+
+
+def generate_db(
+    trips: int,
+    messages: int,
+    tasks: int,
+    photos: int,
+    photo_bytes: int = 30_000,
+    legacy_ratio: float = 0.3,
+    seed: int = 0,
+) -> dict:
+    """Erzeugt eine Datenbank mit ``trips`` Reisen zu je M Nachrichten, K Aufgaben, P Fotos.
+
+    Etwa ``legacy_ratio`` der Reisen liegen im alten Format: Nachrichten
+    doppelt unter ``messages`` und ``chat`` (bzw. nur unter ``chat``),
+    Aufgaben mit ``item``/``checked``.
+    """
+    rng = random.Random(seed)
+    start = datetime.datetime(2025, 6, 1, 8, 0, 0)
+    doc: dict = {"trips": {}}
+    for t in range(trips):
+        legacy = rng.random() < legacy_ratio
+        ts = start + datetime.timedelta(days=t)
+        msgs = []
+        for m in range(messages):
+            ts += datetime.timedelta(seconds=rng.randint(5, 600))
+            msgs.append(_message(rng, t * messages + m, ts, legacy and rng.random() < 0.5))
+        trip = {
+            "name": f"Ausflug {t + 1}",
+            "participants": {name: {"display_name": name, "role": "member"} for name in AUTHORS},
+            "details": {"destination": "See", "city": "Musterstadt"},
+            "last_read": {name: {"chat": start.isoformat(), "checklist": start.isoformat()} for name in AUTHORS},
+            "tasks": [_task(rng, t * tasks + k, ts, legacy and rng.random() < 0.5) for k in range(tasks)],
+            "expenses": [
+                {"id": f"exp_{t}_{e}", "title": _text(rng, 2), "payer": rng.choice(AUTHORS), "amount": round(rng.uniform(3, 80), 2)}
+                for e in range(max(1, tasks // 10))
+            ],
+            "images": [_photo(rng, t * photos + p, ts, photo_bytes) for p in range(photos)],
+        }
+        if legacy:
+            trip["chat"] = msgs
+            if rng.random() < 0.5:
+                trip["messages"] = list(msgs)
+        else:
+            trip["messages"] = msgs
+        doc["trips"][f"trip_{t:04d}"] = trip
+    return doc
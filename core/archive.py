@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import datetime
+import functools
+import os
+import shutil
+import uuid
+
+from core.fileio import read_data, write_data_atomic
+from core.shards import _trip_file_name
+
+# Archivierte Chat-Nachrichten liegen als gzip-komprimierte, unveränderliche
+# Segmente unter ARCHIVE_DIR/<reise>/. Die Reise selbst führt nur die Liste
+# ihrer Segmente in ``trip["archive"]``.
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "data/archive")
+# Nachrichten, die älter als so viele Tage sind, werden archiviert ...
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+# ... ebenso alle jenseits der neuesten ARCHIVE_KEEP Nachrichten.
+ARCHIVE_KEEP = int(os.getenv("ARCHIVE_KEEP", "500"))
+ARCHIVE_FIELD = "archive"
+
+
+def _trip_dir(trip_key: str) -> str:
+    return os.path.join(ARCHIVE_DIR, os.path.splitext(_trip_file_name(trip_key))[0])
+
+
+def _timestamp(msg: dict) -> str:
+    return str(msg.get("created_at") or msg.get("time") or "")
+
+
+def segments(trip: dict) -> list[dict]:
+    entries = trip.get(ARCHIVE_FIELD)
+    return [entry for entry in entries if isinstance(entry, dict) and entry.get("id")] if isinstance(entries, list) else []
+
+
+def archived_count(trip: dict) -> int:
+    return sum(int(entry.get("count") or 0) for entry in segments(trip))
+
+
+def _archivable(messages: list, max_age_days: int, keep: int) -> int:
+    """Länge des ältesten Abschnitts, aus dem archiviert wird.
+
+    Archiviert wird immer ein Anfang der Liste, damit Archiv plus aktuelle
+    Liste die Reihenfolge behalten. Angepinnte Nachrichten bleiben darin
+    trotzdem in der Reise, sie werden ohnehin immer angezeigt.
+    """
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=max_age_days)).isoformat(timespec="minutes")
+    over = max(0, len(messages) - keep)
+    count = 0
+    for pos, msg in enumerate(messages):
+        if not isinstance(msg, dict) or (pos >= over and _timestamp(msg) >= cutoff):
+            break
+        count += 1
+    return count
+
+
+def archive_trip(
+    trip_key: str,
+    trip: dict,
+    max_age_days: int = ARCHIVE_AFTER_DAYS,
+    keep: int = ARCHIVE_KEEP,
+) -> int:
+    """Verschiebt alte Nachrichten in ein neues Segment und gibt deren Anzahl zurück.
+
+    Das Segment wird sofort geschrieben; die Reise wird nur verändert und muss
+    wie gewohnt mit save_db gespeichert werden.
+    """
+    messages = trip.get("messages") or []
+    prefix = _archivable(messages, max_age_days, keep)
+    moved = [msg for msg in messages[:prefix] if not msg.get("pinned")]
+    if not moved:
+        return 0
+    count = len(moved)
+    segment_id = f"{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    file_name = f"{segment_id}.json.gz"
+    path = os.path.join(_trip_dir(trip_key), file_name)
+    write_data_atomic(path, {"trip": trip_key, "messages": moved}, codec="json", compression="gzip")
+    trip.setdefault(ARCHIVE_FIELD, []).append(
+        {
+            "id": segment_id,
+            "file": file_name,
+            "count": count,
+            "first": _timestamp(moved[0]),
+            "last": _timestamp(moved[-1]),
+        }
+    )
+    trip["messages"] = [msg for msg in messages[:prefix] if msg.get("pinned")] + messages[prefix:]
+    return count
+
+
+@functools.lru_cache(maxsize=64)
+def _read_segment(path: str) -> tuple:
+    # Segmente werden nie überschrieben, der Pfad genügt als Schlüssel.
+    doc = read_data(path, {})
+    messages = doc.get("messages") if isinstance(doc, dict) else None
+    return tuple(msg for msg in messages or [] if isinstance(msg, dict))
+
+
+def load_archived(trip_key: str, trip: dict) -> list[dict]:
+    """Alle archivierten Nachrichten einer Reise, älteste zuerst.
+
+    Liest die Segmente erst bei Bedarf. Die Nachrichten sind geteilt und
+    dürfen nicht verändert werden.
+    """
+    seen: set = set()
+    messages = []
+    for entry in sorted(segments(trip), key=lambda entry: (str(entry.get("first") or ""), entry["id"])):
+        for msg in _read_segment(os.path.join(_trip_dir(trip_key), str(entry.get("file") or ""))):
+            # Zwei Sitzungen können dieselben Nachrichten gleichzeitig archivieren.
+            msg_id = msg.get("id")
+            if msg_id is not None:
+                if msg_id in seen:
+                    continue
+                seen.add(msg_id)
+            messages.append(msg)
+    return messages
+
+
+def remove_segments(trip_key: str, before: dict | None, after: dict | None) -> int:
+    """Löscht Segmentdateien, die ``before`` führt und ``after`` nicht mehr.
+
+    ``after`` ist der gespeicherte Stand (nach einem Merge); ``None`` heißt,
+    die Reise wurde gelöscht, dann fällt ihr ganzes Archivverzeichnis weg.
+    """
+    directory = _trip_dir(trip_key)
+    if after is None:
+        count = len(segments(before or {}))
+        if os.path.isdir(directory):
+            shutil.rmtree(directory, ignore_errors=True)
+            _read_segment.cache_clear()
+        return count
+    kept = {entry["id"] for entry in segments(after)}
+    removed = 0
+    for entry in segments(before or {}):
+        if entry["id"] in kept:
+            continue
+        try:
+            os.remove(os.path.join(directory, str(entry.get("file") or "")))
+        except OSError:
+            continue
+        removed += 1
+    if removed:
+        _read_segment.cache_clear()
+    return removed
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import os
+import threading
+import time
+from collections import Counter
+
+from core.fileio import read_data, write_data_atomic
+
+# Fotos liegen als Dateien unter BLOB_DIR/<2 Zeichen>/<SHA-256>; die Reise
+# speichert nur die Hashes: ``img["blob"]`` (Anzeigefassung), ``img["thumb"]``
+# (Vorschau) und ``img["original"]`` (hochgeladene Datei). ``refs.json`` zählt
+# pro Hash die Verwendungen.
+BLOB_DIR = os.getenv("BLOB_DIR", "data/blobs")
+IMAGE_BLOB_FIELDS = ("blob", "thumb", "original")
+REFS_FILE = "refs.json"
+# Jüngere Dateien lässt collect liegen: ihr Foto ist evtl. noch nicht gespeichert.
+COLLECT_MIN_AGE_SECONDS = 3600
+
+
+class BlobStore:
+    """Inhaltsadressierte Dateien mit Referenzzählern.
+
+    Gleicher Inhalt wird nur einmal abgelegt. Fällt ein Zähler auf 0, bleibt
+    die Datei zunächst liegen; ``collect`` löscht sie erst, nachdem ein
+    Abgleich mit allen Reisen bestätigt hat, dass niemand sie mehr verwendet.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.refs_path = os.path.join(directory, REFS_FILE)
+        self._lock = threading.Lock()
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            # Schützt eine gerade unbenutzte Datei vor collect.
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest: str) -> bytes | None:
+        try:
+            with open(self.path(digest), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def refs(self) -> dict[str, int]:
+        refs = read_data(self.refs_path, {})
+        return refs if isinstance(refs, dict) else {}
+
+    def adjust(self, deltas: dict[str, int]) -> None:
+        deltas = {digest: delta for digest, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        with self._lock:
+            refs = self.refs()
+            for digest, delta in deltas.items():
+                count = max(0, int(refs.get(digest) or 0) + delta)
+                refs[digest] = count
+            write_data_atomic(self.refs_path, refs)
+
+    def rebuild(self, counts: dict[str, int]) -> None:
+        with self._lock:
+            refs = {digest: 0 for digest in self.refs()}
+            refs.update(counts)
+            write_data_atomic(self.refs_path, refs)
+
+    def stored(self) -> set[str]:
+        digests = set()
+        if not os.path.isdir(self.directory):
+            return digests
+        for prefix in os.listdir(self.directory):
+            folder = os.path.join(self.directory, prefix)
+            if len(prefix) == 2 and os.path.isdir(folder):
+                digests.update(name for name in os.listdir(folder) if not name.endswith(".tmp"))
+        return digests
+
+    def collect(self, referenced: set[str]) -> list[str]:
+        """Löscht Dateien mit Zähler 0 (oder ohne Zähler), die nicht in ``referenced`` sind."""
+        removed = []
+        cutoff = time.time() - COLLECT_MIN_AGE_SECONDS
+        with self._lock:
+            refs = self.refs()
+            for digest in self.stored():
+                if digest in referenced or int(refs.get(digest) or 0) > 0:
+                    continue
+                if os.path.getmtime(self.path(digest)) > cutoff:
+                    continue
+                os.remove(self.path(digest))
+                refs.pop(digest, None)
+                removed.append(digest)
+            if removed:
+                write_data_atomic(self.refs_path, refs)
+        return removed
+
+
+_stores: dict[str, BlobStore] = {}
+
+
+def blob_store() -> BlobStore:
+    store = _stores.get(BLOB_DIR)
+    if store is None:
+        store = _stores[BLOB_DIR] = BlobStore(BLOB_DIR)
+    return store
+
+
+def image_refs(images) -> Counter:
+    """Anzahl der Verwendungen pro Blob-Hash in einer Bilderliste."""
+    return Counter(
+        img[field]
+        for img in images or []
+        if isinstance(img, dict)
+        for field in IMAGE_BLOB_FIELDS
+        if img.get(field)
+    )
+
+
+def image_bytes(img: dict, rendition: str = "blob") -> bytes | None:
+    """Inhalt eines Fotos aus dem Blob-Speicher oder, bei alten Einträgen, aus base64.
+
+    ``rendition`` ist eines der IMAGE_BLOB_FIELDS; fehlt diese Fassung, wird
+    die Anzeigefassung geliefert.
+    """
+    if img.get(rendition):
+        return blob_store().get(img[rendition])
+    if img.get("blob"):
+        return blob_store().get(img["blob"])
+    if img.get("data"):
+        return base64.b64decode(img["data"])
+    return None
+
+
+def extract_images(images: list) -> int:
+    """Verschiebt base64-Inhalte in den Blob-Speicher; gibt die Anzahl zurück."""
+    moved = 0
+    for img in images or []:
+        if not isinstance(img, dict) or not img.get("data"):
+            continue
+        try:
+            data = base64.b64decode(img["data"])
+        except Exception:
+            continue
+        img["blob"] = blob_store().put(data)
+        img["size"] = len(data)
+        img.pop("data")
+        moved += 1
+    return moved
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+from typing import Any, Callable
+
+# Listen mit Einträgen, die eine eigene "id" tragen und einzeln geändert werden.
+ITEM_COLLECTIONS = ("messages", "tasks", "expenses", "images")
+
+# Ab Formatversion 2 steht der Chat nur noch unter "messages". Ältere Dateien
+# führen zusätzlich (oder ausschließlich) eine Kopie unter "chat".
+FORMAT_VERSION = 2
+LEGACY_CHAT_FIELD = "chat"
+
+
+def trip_messages(trip: dict) -> list:
+    """Nachrichten einer Reise, bei Altbeständen aus dem "chat"-Feld."""
+    messages = trip.get("messages")
+    if isinstance(messages, list) and messages:
+        return messages
+    legacy = trip.get(LEGACY_CHAT_FIELD)
+    if isinstance(legacy, list) and legacy:
+        return legacy
+    return messages if isinstance(messages, list) else []
+
+
+def diff_db(old: dict, new: dict) -> list[dict]:
+    ops: list[dict] = []
+    for key in old:
+        if key != "trips" and key not in new:
+            ops.append({"op": "meta_del", "key": key})
+    for key, value in new.items():
+        if key == "trips":
+            continue
+        if key not in old or old[key] != value:
+            ops.append({"op": "meta_set", "key": key, "value": value})
+
+    old_trips = old.get("trips") or {}
+    new_trips = new.get("trips") or {}
+    for trip_key in old_trips:
+        if trip_key not in new_trips:
+            ops.append({"op": "trip_del", "trip": trip_key})
+    for trip_key, trip in new_trips.items():
+        before = old_trips.get(trip_key)
+        if not isinstance(before, dict) or not isinstance(trip, dict):
+            if before != trip or trip_key not in old_trips:
+                ops.append({"op": "trip_put", "trip": trip_key, "value": trip})
+        elif before != trip:
+            ops.extend(diff_trip(trip_key, before, trip))
+    return ops
+
+
+def diff_trip(trip_key: str, old: dict, new: dict) -> list[dict]:
+    ops: list[dict] = []
+    for field in old:
+        if field not in new:
+            ops.append({"op": "field_del", "trip": trip_key, "field": field})
+    for field, value in new.items():
+        if field in old and old[field] == value:
+            continue
+        if field in ITEM_COLLECTIONS and field in old:
+            item_ops = _diff_items(trip_key, field, old[field], value)
+            if item_ops is not None:
+                ops.extend(item_ops)
+                continue
+        ops.append({"op": "field_set", "trip": trip_key, "field": field, "value": value})
+    return ops
+
+
+def _index_items(items: Any) -> dict[str, dict] | None:
+    if not isinstance(items, list):
+        return None
+    by_id: dict[str, dict] = {}
+    for item in items:
+        item_id = item.get("id") if isinstance(item, dict) else None
+        if not item_id or item_id in by_id:
+            return None
+        by_id[item_id] = item
+    return by_id
+
+
+def _diff_items(trip_key: str, field: str, old_items: Any, new_items: Any) -> list[dict] | None:
+    old_by_id = _index_items(old_items)
+    new_by_id = _index_items(new_items)
+    if old_by_id is None or new_by_id is None:
+        return None
+
+    kept_old_order = [item_id for item_id in old_by_id if item_id in new_by_id]
+    new_ids = list(new_by_id)
+    # Nur Löschen, Ändern und Anhängen am Ende lassen sich als Einzeländerung
+    # abbilden; bei Umsortierung wird die Liste komplett geschrieben.
+    if new_ids[: len(kept_old_order)] != kept_old_order:
+        return None
+
+    ops: list[dict] = []
+    for item_id in old_by_id:
+        if item_id not in new_by_id:
+            ops.append({"op": "item_del", "trip": trip_key, "field": field, "id": item_id})
+    for item_id in kept_old_order:
+        if old_by_id[item_id] != new_by_id[item_id]:
+            ops.append({"op": "item_put", "trip": trip_key, "field": field, "value": new_by_id[item_id]})
+    for item_id in new_ids[len(kept_old_order):]:
+        ops.append({"op": "item_put", "trip": trip_key, "field": field, "value": new_by_id[item_id]})
+    return ops
+
+
+def apply_ops(doc: dict, ops: list[dict]) -> dict:
+    """Wendet Änderungen an und gibt ein neues Dokument zurück.
+
+    Berührte Dicts und Listen werden kopiert statt verändert, damit bereits
+    ausgegebene Stände (z. B. im gemeinsamen Cache) unverändert bleiben.
+    """
+    doc = dict(doc)
+    trips = dict(doc.get("trips") or {})
+    doc["trips"] = trips
+    copied: set = set()
+
+    def _trip(trip_key: str) -> dict:
+        if trip_key not in copied:
+            trips[trip_key] = dict(trips.get(trip_key) or {})
+            copied.add(trip_key)
+        return trips[trip_key]
+
+    def _items(trip_key: str, field: str) -> list:
+        trip = _trip(trip_key)
+        if (trip_key, field) not in copied:
+            current = trip.get(field)
+            trip[field] = list(current) if isinstance(current, list) else []
+            copied.add((trip_key, field))
+        return trip[field]
+
+    for op in ops:
+        kind = op.get("op")
+        if kind == "meta_set":
+            doc[op["key"]] = op["value"]
+        elif kind == "meta_del":
+            doc.pop(op["key"], None)
+        elif kind in {"trip_put", "trip_del"}:
+            if kind == "trip_put":
+                trips[op["trip"]] = op["value"]
+            else:
+                trips.pop(op["trip"], None)
+            copied = {c for c in copied if c != op["trip"] and not (isinstance(c, tuple) and c[0] == op["trip"])}
+        elif kind == "field_set":
+            _trip(op["trip"])[op["field"]] = op["value"]
+            copied.discard((op["trip"], op["field"]))
+        elif kind == "field_del":
+            if op["trip"] in trips:
+                _trip(op["trip"]).pop(op["field"], None)
+                copied.discard((op["trip"], op["field"]))
+        elif kind == "item_put":
+            items = _items(op["trip"], op["field"])
+            value = op["value"]
+            for idx, item in enumerate(items):
+                if isinstance(item, dict) and item.get("id") == value.get("id"):
+                    items[idx] = value
+                    break
+            else:
+                items.append(value)
+        elif kind == "item_del":
+            if op["trip"] not in trips:
+                continue
+            items = _items(op["trip"], op["field"])
+            items[:] = [
+                item for item in items
+                if not (isinstance(item, dict) and item.get("id") == op["id"])
+            ]
+    return doc
+
+
+# -- Gleichzeitige Änderungen ------------------------------------------------
+
+_MISSING = object()
+# Berechnen aus der Reise abgeleitete Felder (z. B. Ungelesen-Zähler) nach
+# einem Merge neu; die eigenen Werte beruhen auf dem veralteten Stand.
+MERGE_HOOKS: list[Callable[[dict], Any]] = []
+
+
+def trip_version(trip: dict | None) -> int:
+    return int(trip.get("version") or 0) if isinstance(trip, dict) else 0
+
+
+def _is_item_list(value: Any) -> bool:
+    return isinstance(value, list) and _index_items(value) is not None
+
+
+def _merge_items(base: list, mine: list, theirs: list) -> list:
+    base_by_id = _index_items(base) or {}
+    mine_by_id = _index_items(mine) or {}
+    merged = []
+    for item_id, their_item in (_index_items(theirs) or {}).items():
+        if item_id in mine_by_id:
+            merged.append(merge_values(base_by_id.get(item_id, {}), mine_by_id[item_id], their_item))
+        elif item_id not in base_by_id:
+            # Von der anderen Sitzung neu angelegt.
+            merged.append(their_item)
+        # Sonst hier gelöscht: Löschen gewinnt, auch wenn dort geändert wurde.
+    their_ids = {item.get("id") for item in theirs}
+    for item_id, my_item in mine_by_id.items():
+        if item_id not in base_by_id and item_id not in their_ids:
+            merged.append(my_item)
+    return merged
+
+
+def _merge_scalar_list(base: list, mine: list, theirs: list) -> list:
+    removed = [value for value in base if value not in mine]
+    merged = [value for value in theirs if value not in removed]
+    merged.extend(value for value in mine if value not in base and value not in merged)
+    return merged
+
+
+def merge_values(base: Any, mine: Any, theirs: Any) -> Any:
+    """Dreiwege-Merge eines Werts: eigene Änderung auf den neuesten Stand.
+
+    Dicts werden schlüsselweise, Listen mit ``id``-Einträgen eintragsweise und
+    Listen einfacher Werte (Reaktionen, Zuständige) als Menge
+    zusammengeführt. Bei echten Konflikten gewinnt die eigene Änderung.
+    """
+    if mine == base:
+        return theirs
+    if theirs == base or theirs == mine:
+        return mine
+    if isinstance(mine, dict) and isinstance(theirs, dict):
+        base = base if isinstance(base, dict) else {}
+        merged = {}
+        for key in list(theirs) + [key for key in mine if key not in theirs]:
+            b = base.get(key, _MISSING)
+            m = mine.get(key, _MISSING)
+            t = theirs.get(key, _MISSING)
+            if m is _MISSING:
+                if t != b:
+                    merged[key] = t
+            elif t is _MISSING:
+                if m != b:
+                    merged[key] = m
+            else:
+                merged[key] = merge_values({} if b is _MISSING else b, m, t)
+        return merged
+    if isinstance(mine, list) and isinstance(theirs, list):
+        base = base if isinstance(base, list) else []
+        if _is_item_list(mine) and _is_item_list(theirs) and _is_item_list(base):
+            return _merge_items(base, mine, theirs)
+        if not any(isinstance(value, (dict, list)) for value in [*base, *mine, *theirs]):
+            return _merge_scalar_list(base, mine, theirs)
+    return mine
+
+
+def rebase_change(
+    baseline: dict | None,
+    payload: dict,
+    current_version: int | None,
+    load_current: Callable[[], dict | None],
+) -> tuple[dict | None, dict]:
+    """Prüft die Version einer zu speichernden Reise und erhöht sie.
+
+    Wurde die Reise seit dem Laden (``baseline``) von einer anderen Sitzung
+    gespeichert, wird die eigene Änderung per :func:`merge_values` auf den
+    aktuellen Stand übertragen statt ihn zu überschreiben; danach laufen die
+    :data:`MERGE_HOOKS` auf dem Ergebnis. Gibt die neue
+    Vergleichsgrundlage und den zu schreibenden Stand zurück.
+    """
+    if baseline is not None and current_version is not None and current_version != trip_version(baseline):
+        current = load_current()
+        if isinstance(current, dict):
+            payload = dict(merge_values(baseline, payload, current))
+            baseline = current
+            for hook in MERGE_HOOKS:
+                hook(payload)
+    payload["version"] = (current_version or 0) + 1
+    return baseline, payload
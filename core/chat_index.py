@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import bisect
+import re
+import threading
+import unicodedata
+
+from core import storage
+from core.archive import load_archived, segments
+from core.changes import trip_version
+
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+_TOKEN_RE = re.compile(r"\w+")
+# Felder einer Nachricht, die durchsucht werden; dazu der aufgelöste Name des Autors.
+_FIELDS = ("text", "author", "display_name")
+
+
+def fold(text: str) -> str:
+    """Kleinschreibung, Umlaute ausgeschrieben, übrige Akzente entfernt."""
+    folded = unicodedata.normalize("NFC", str(text or "")).lower().translate(_UMLAUTS)
+    decomposed = unicodedata.normalize("NFKD", folded)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> set[str]:
+    return set(_TOKEN_RE.findall(fold(text)))
+
+
+def message_author(msg: dict) -> str:
+    """Autor einer Nachricht, wie er gespeichert ist (ID, Alias oder Name)."""
+    return str(msg.get("author") or msg.get("user") or msg.get("created_by") or msg.get("display_name") or "Unbekannt")
+
+
+def _signature(msg: dict, people: dict[str, str]) -> tuple:
+    author = message_author(msg)
+    return (*(str(msg.get(field) or "") for field in _FIELDS), people.get(author, author))
+
+
+class ChatIndex:
+    """Invertierter Index einer Reise: Token → Nachrichten-IDs.
+
+    Die Tokens liegen zusätzlich sortiert vor, damit Präfixsuchen per
+    Binärsuche nur die passenden Tokens anfassen. ``people`` bildet Namen und
+    Aliase auf den aktuellen Anzeigenamen ab; nach einer Umbenennung sind
+    ältere Nachrichten also auch unter dem neuen Namen zu finden.
+    """
+
+    def __init__(self):
+        self.version: int | None = None
+        self.size = 0
+        self.people: dict[str, str] = {}
+        self._postings: dict[str, set[str]] = {}
+        self._tokens: list[str] = []
+        self._docs: dict[str, tuple[tuple, set[str]]] = {}
+        self._positions: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def put(self, msg_id: str, msg: dict) -> None:
+        signature = _signature(msg, self.people)
+        current = self._docs.get(msg_id)
+        if current is not None and current[0] == signature:
+            return
+        self.remove(msg_id)
+        tokens = set().union(*(tokenize(value) for value in signature))
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = set()
+                bisect.insort(self._tokens, token)
+            posting.add(msg_id)
+        self._docs[msg_id] = (signature, tokens)
+
+    def remove(self, msg_id: str) -> None:
+        entry = self._docs.pop(msg_id, None)
+        if entry is None:
+            return
+        for token in entry[1]:
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.discard(msg_id)
+            if not posting:
+                del self._postings[token]
+                pos = bisect.bisect_left(self._tokens, token)
+                if pos < len(self._tokens) and self._tokens[pos] == token:
+                    del self._tokens[pos]
+
+    def sync(self, messages: list, version: int | None = None, people: dict[str, str] | None = None) -> None:
+        """Gleicht den Index mit der Nachrichtenliste ab; nur Geändertes wird neu zerlegt."""
+        if people is not None:
+            self.people = dict(people)
+        positions = {}
+        for pos, msg in enumerate(messages):
+            if isinstance(msg, dict) and msg.get("id"):
+                positions[msg["id"]] = pos
+                self.put(msg["id"], msg)
+        for msg_id in [msg_id for msg_id in self._docs if msg_id not in positions]:
+            self.remove(msg_id)
+        self._positions = positions
+        self.version = version
+        self.size = len(messages)
+
+    def _prefix_ids(self, prefix: str) -> set[str]:
+        ids: set[str] = set()
+        pos = bisect.bisect_left(self._tokens, prefix)
+        while pos < len(self._tokens) and self._tokens[pos].startswith(prefix):
+            ids |= self._postings[self._tokens[pos]]
+            pos += 1
+        return ids
+
+    def search(self, query: str) -> list[str]:
+        """IDs der Nachrichten, die zu jedem Suchwort ein Token mit diesem Präfix haben.
+
+        Ergebnis in der Reihenfolge der Nachrichtenliste.
+        """
+        terms = sorted(tokenize(query), key=len, reverse=True)
+        if not terms:
+            return []
+        ids = self._prefix_ids(terms[0])
+        for term in terms[1:]:
+            if not ids:
+                break
+            ids &= self._prefix_ids(term)
+        return sorted(ids, key=lambda msg_id: self._positions.get(msg_id, 0))
+
+    def position(self, msg_id: str) -> int | None:
+        return self._positions.get(msg_id)
+
+
+_lock = threading.Lock()
+_indexes: dict[str, ChatIndex] = {}
+# Archivierte Nachrichten pro Reise samt Index; Version ist die Liste der Segment-IDs.
+_archive_indexes: dict[str, tuple[ChatIndex, list[dict]]] = {}
+
+
+def _current_index(trip_key: str, trip: dict, people: dict[str, str]) -> ChatIndex:
+    messages = trip.get("messages") or []
+    version = trip_version(trip)
+    index = _indexes.get(trip_key)
+    if index is None:
+        index = _indexes[trip_key] = ChatIndex()
+    # Version und Länge genügen als Prüfung: gespeicherte Änderungen erhöhen
+    # die Version, lokale Anhänge die Länge.
+    if index.version != version or index.size != len(messages) or index.people != people:
+        index.sync(messages, version, people)
+    return index
+
+
+def _archive_version(trip: dict) -> tuple:
+    return tuple(sorted(entry["id"] for entry in segments(trip)))
+
+
+def _on_commit(trip_key: str, trip: dict | None) -> None:
+    with _lock:
+        if trip is None:
+            _indexes.pop(trip_key, None)
+            _archive_indexes.pop(trip_key, None)
+            return
+        if trip_key in _indexes:
+            _indexes[trip_key].sync(trip.get("messages") or [], trip_version(trip))
+        entry = _archive_indexes.get(trip_key)
+        if entry is not None and entry[0].version != _archive_version(trip):
+            # Segmente hinzugekommen oder (Chat geleert) gelöscht.
+            del _archive_indexes[trip_key]
+
+
+storage.subscribe(_on_commit)
+
+
+def search_messages(trip_key: str, trip: dict, query: str, people: dict[str, str] | None = None) -> list[dict]:
+    """Treffer für ``query`` in zeitlicher Reihenfolge der Nachrichtenliste.
+
+    ``people`` (Name/Alias → Anzeigename) löst Autoren wie im Chat angezeigt auf.
+    """
+    messages = trip.get("messages") or []
+    people = people or {}
+    with _lock:
+        index = _current_index(trip_key, trip, people)
+        hits = []
+        for msg_id in index.search(query):
+            pos = index.position(msg_id)
+            msg = messages[pos] if pos is not None and pos < len(messages) else None
+            if not isinstance(msg, dict) or msg.get("id") != msg_id:
+                # Die Liste wurde seit dem Abgleich umgestellt: neu abgleichen.
+                index.sync(messages, trip_version(trip))
+                found = set(index.search(query))
+                return [m for m in messages if isinstance(m, dict) and m.get("id") in found]
+            hits.append(msg)
+        return hits
+
+
+def search_archived(trip_key: str, trip: dict, query: str, people: dict[str, str] | None = None) -> list[dict]:
+    """Treffer in den archivierten Nachrichten; liest die Segmente nur beim ersten Mal."""
+    version = _archive_version(trip)
+    if not version:
+        return []
+    people = people or {}
+    with _lock:
+        entry = _archive_indexes.get(trip_key)
+        if entry is None or entry[0].version != version:
+            messages = load_archived(trip_key, trip)
+            index = ChatIndex()
+            index.sync(messages, version, people)
+            entry = _archive_indexes[trip_key] = (index, messages)
+        index, messages = entry
+        if index.people != people:
+            index.sync(messages, version, people)
+        return [messages[index.position(msg_id)] for msg_id in index.search(query)]
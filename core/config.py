@@ -16,4 +16,13 @@ DB_FILE = os.getenv("DB_FILE", "data/reisen_daten.json")
 BACKUP_FOLDER = os.getenv("BACKUP_FOLDER", "backups")
 MAX_BACKUPS = int(os.getenv("MAX_BACKUPS", "20"))
 
+# Live-Updates über app/event_sidecar.py: EVENTS_URL ist die Adresse, unter der
+# der Browser den Dienst erreicht (leer = Abfrage alle paar Sekunden),
+# EVENTS_PUBLISH_URL die Adresse, an die die App Änderungen meldet.
+# EVENTS_TOKEN ist das gemeinsame Geheimnis von App und Dienst für diese
+# Meldungen; ohne Token bleibt es bei der Abfrage.
+EVENTS_URL = os.getenv("EVENTS_URL", "")
+EVENTS_PUBLISH_URL = os.getenv("EVENTS_PUBLISH_URL", "http://127.0.0.1:8765")
+EVENTS_TOKEN = os.getenv("EVENTS_TOKEN", "")
+
 PRIMARY_COLOR = "#4285F4"
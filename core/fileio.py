@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import contextlib
+import datetime
+import gzip
+import json
+import os
+import tempfile
+
+try:
+    import fcntl
+except Exception:
+    fcntl = None
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+try:
+    import msgpack
+except Exception:
+    msgpack = None
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+# "json" (kompakt), "json-pretty" (eingerückt), "orjson" oder "msgpack". Fehlt
+# die Bibliothek, wird kompaktes JSON geschrieben. Gelesen wird jedes Format.
+DB_CODEC = os.getenv("DB_CODEC", "json").strip().lower()
+# "none", "gzip" oder "zstd" für DB-Datei, Snapshot und Reise-Dateien.
+DB_COMPRESSION = os.getenv("DB_COMPRESSION", "none").strip().lower()
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+class CodecUnavailable(RuntimeError):
+    """Die Datei ist lesbar, aber die nötige Bibliothek fehlt."""
+
+
+def encode(payload, codec: str | None = None) -> bytes:
+    codec = codec or DB_CODEC
+    if codec == "msgpack" and msgpack is not None:
+        return msgpack.packb(payload, use_bin_type=True)
+    if codec == "orjson" and orjson is not None:
+        return orjson.dumps(payload)
+    if codec == "json-pretty":
+        return json.dumps(payload, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def compression_used(compression: str | None = None) -> str:
+    """Kompression, die :func:`compress` tatsächlich anwendet: "none", "gzip" oder "zstd"."""
+    compression = compression or DB_COMPRESSION
+    if compression == "zstd" and zstandard is not None:
+        return "zstd"
+    if compression in {"gzip", "zstd"}:
+        # Ohne zstandard wird auf gzip ausgewichen.
+        return "gzip"
+    return "none"
+
+
+def compress(raw: bytes, compression: str | None = None) -> bytes:
+    compression = compression_used(compression)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compress(raw)
+    if compression == "gzip":
+        return gzip.compress(raw, compresslevel=6)
+    return raw
+
+
+def decode(raw: bytes):
+    """Erkennt Kompression und Format anhand der ersten Bytes."""
+    if raw.startswith(GZIP_MAGIC):
+        return decode(gzip.decompress(raw))
+    if raw.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise CodecUnavailable("zstd-komprimierte Datei, aber 'zstandard' ist nicht installiert")
+        return decode(zstandard.ZstdDecompressor().decompressobj().decompress(raw))
+    if raw.startswith(b"\xef\xbb\xbf"):
+        raw = raw[3:]
+    first = raw.lstrip()[:1]
+    if first and first not in b"{[\"":
+        if msgpack is None:
+            raise CodecUnavailable("msgpack-Datei, aber 'msgpack' ist nicht installiert")
+        return msgpack.unpackb(raw, raw=False)
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode("utf-8"))
+
+
+def read_data(path: str, default=None):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, "rb") as f:
+            return decode(f.read())
+    except CodecUnavailable:
+        # Nicht als leere Datenbank behandeln, sonst überschreibt der nächste
+        # Speichervorgang die Datei.
+        raise
+    except Exception:
+        return default
+
+
+def write_bytes_atomic(path: str, raw: bytes) -> None:
+    """Schreibt ``raw`` über eine eigene temporäre Datei und ersetzt ``path`` atomar.
+
+    Der Name der temporären Datei ist pro Aufruf eindeutig, damit mehrere
+    Prozesse oder Threads dieselbe Datei gleichzeitig schreiben können.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def write_data_atomic(path: str, payload, codec: str | None = None, compression: str | None = None) -> None:
+    write_bytes_atomic(path, compress(encode(payload, codec), compression))
+
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    """Exklusive Sperre über Prozesse hinweg (``<path>.lock``), ohne fcntl ein No-op."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def write_backup(folder: str, name: str, payload, max_backups: int, compression: str = "gzip") -> str:
+    """Schreibt einen Snapshot und löscht die ältesten über ``max_backups``.
+
+    Die Endung (``.json``, ``.json.gz``, ``.json.zst``) folgt der tatsächlich
+    verwendeten Kompression.
+    """
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    suffix = COMPRESSION_SUFFIXES.get(compression_used(compression), "")
+    path = os.path.join(folder, f"{name}-{stamp}.json{suffix}")
+    write_data_atomic(path, payload, codec="json", compression=compression)
+    backups = sorted(
+        entry for entry in os.listdir(folder)
+        if entry.startswith(f"{name}-") and not entry.endswith(".tmp")
+    )
+    for entry in backups[: max(0, len(backups) - max_backups)]:
+        os.remove(os.path.join(folder, entry))
+    return path
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import functools
+import multiprocessing
+import os
+import threading
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from core.blobstore import blob_store, image_bytes
+
+# Längste Kante der Fassungen, die zu jedem Foto gespeichert werden.
+THUMB_SIZE = 320
+DISPLAY_SIZE = 1024
+WEBP_QUALITY = 70
+# Schutz vor Dekompressionsbomben: größere Bilder werden nicht dekodiert.
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "60000000"))
+# Prozesse für das Umrechnen beim Hochladen (Standard: verfügbare Kerne).
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "0")) or (
+    len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+)
+
+# Gedrehte Fassungen im Speicher (Vorschau ~10 KB, Anzeige ~100 KB).
+ROTATED_CACHE_SIZE = 256
+# Uhrzeigersinn -> Transpose-Methode.
+_TRANSPOSE = {
+    90: Image.Transpose.ROTATE_270,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_90,
+}
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def open_image(data: bytes, max_side: int | None = None) -> Image.Image:
+    """Dekodiert hochgeladene Bilddaten, aufrecht gedreht und höchstens ``max_side`` groß.
+
+    JPEGs werden per Draft-Modus gleich in reduzierter Größe (1/2 … 1/8)
+    dekodiert, statt zuerst das volle Kamerabild in den Speicher zu laden.
+    Bilder mit mehr als MAX_IMAGE_PIXELS Pixeln werden abgewiesen, bevor
+    ihre Pixel gelesen werden.
+    """
+    img = Image.open(BytesIO(data))
+    width, height = img.size
+    if width * height > MAX_IMAGE_PIXELS:
+        img.close()
+        raise Image.DecompressionBombError(
+            f"Bild zu groß: {width}x{height} Pixel (höchstens {MAX_IMAGE_PIXELS})"
+        )
+    if max_side:
+        img.draft("RGB", (max_side, max_side))
+    img = ImageOps.exif_transpose(img)
+    if max_side:
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    return img
+
+
+def _encode(img: Image.Image, max_side: int, quality: int = WEBP_QUALITY) -> bytes:
+    img = img.copy()
+    img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+    buf = BytesIO()
+    img.save(buf, format="WEBP", quality=quality)
+    return buf.getvalue()
+
+
+def renditions(data: bytes) -> dict[str, bytes]:
+    """Anzeige- (DISPLAY_SIZE) und Vorschaufassung (THUMB_SIZE) als WebP.
+
+    Die Vorschau wird aus der bereits verkleinerten Anzeigefassung gerechnet.
+    """
+    display = open_image(data, DISPLAY_SIZE)
+    return {
+        "display": _encode(display, DISPLAY_SIZE),
+        "thumb": _encode(display, THUMB_SIZE),
+    }
+
+
+def rotation(img: dict) -> int:
+    """Gespeicherte Drehung eines Fotos im Uhrzeigersinn: 0, 90, 180 oder 270."""
+    try:
+        return int(img.get("rotation") or 0) // 90 % 4 * 90
+    except (TypeError, ValueError):
+        return 0
+
+
+def _rotate(data: bytes, angle: int) -> bytes:
+    with Image.open(BytesIO(data)) as img:
+        rotated = img.transpose(_TRANSPOSE[angle])
+    return _encode(rotated, max(rotated.size))
+
+
+@functools.lru_cache(maxsize=ROTATED_CACHE_SIZE)
+def _rotated_blob(digest: str, angle: int) -> bytes | None:
+    data = blob_store().get(digest)
+    return None if data is None else _rotate(data, angle)
+
+
+def view_bytes(img: dict, rendition: str = "blob") -> bytes | None:
+    """Wie :func:`image_bytes`, aber in der gespeicherten Drehung des Fotos.
+
+    Gedreht wird immer die unveränderte gespeicherte Fassung; das Ergebnis
+    wird pro Hash und Winkel zwischengespeichert.
+    """
+    angle = rotation(img)
+    field = rendition if img.get(rendition) else "blob"
+    if angle and img.get(field):
+        return _rotated_blob(img[field], angle)
+    data = image_bytes(img, rendition)
+    if angle and data is not None:
+        return _rotate(data, angle)
+    return data
+
+
+def add_thumbnails(images: list) -> int:
+    """Ergänzt fehlende Vorschaufassungen; gibt die Anzahl zurück."""
+    added = 0
+    for img in images or []:
+        if not isinstance(img, dict) or img.get("thumb") or not img.get("blob"):
+            continue
+        data = image_bytes(img)
+        if data is None:
+            continue
+        try:
+            img["thumb"] = blob_store().put(renditions(data)["thumb"])
+        except Exception:
+            continue
+        added += 1
+    return added
+
+
+def _get_pool() -> ProcessPoolExecutor | None:
+    global _pool
+    with _pool_lock:
+        if _pool is None and IMAGE_WORKERS > 1:
+            try:
+                # "spawn", weil der Streamlit-Prozess Threads hat.
+                _pool = ProcessPoolExecutor(IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            except Exception:
+                _pool = None
+        return _pool
+
+
+def _drop_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _safe_renditions(data: bytes) -> dict[str, bytes] | Exception:
+    try:
+        return renditions(data)
+    except Exception as exc:
+        return exc
+
+
+def iter_renditions(items: Iterable[tuple[object, bytes]]) -> Iterator[tuple[object, dict[str, bytes] | Exception]]:
+    """Rechnet :func:`renditions` für ``(Schlüssel, Bilddaten)``-Paare parallel.
+
+    Liefert ``(Schlüssel, Fassungen oder Fehler)`` in Fertigstellungsreihenfolge.
+    Je Prozess sind höchstens zwei Bilder gleichzeitig in Arbeit, ``items``
+    wird entsprechend nach und nach gelesen. Ohne Prozesse (ein Kern) oder
+    wenn der Pool ausfällt, wird im aufrufenden Prozess weitergerechnet.
+    """
+    pool = _get_pool()
+    source = iter(items)
+    pending: dict[Future, tuple[object, bytes]] = {}
+    broken = pool is None
+    while not broken:
+        while len(pending) < IMAGE_WORKERS * 2:
+            item = next(source, None)
+            if item is None:
+                break
+            try:
+                pending[pool.submit(_safe_renditions, item[1])] = item
+            except (BrokenProcessPool, RuntimeError):
+                broken = True
+                yield item[0], _safe_renditions(item[1])
+                break
+        if broken or not pending:
+            break
+        done, _running = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                broken = True
+                break
+            yield pending.pop(future)[0], result
+    if pool is not None and broken:
+        _drop_pool(pool)
+    # Nach einem Ausfall des Pools: Offenes im aufrufenden Prozess rechnen.
+    for future, (key, data) in pending.items():
+        if future.done() and not future.cancelled() and future.exception() is None:
+            yield key, future.result()
+        else:
+            yield key, _safe_renditions(data)
+    for key, data in source:
+        yield key, _safe_renditions(data)
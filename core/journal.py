@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import datetime
+import json
+import os
+import threading
+
+from core.changes import apply_ops, diff_trip
+from core.fileio import file_lock, read_data, write_bytes_atomic, write_data_atomic
+from core.json_store import JsonStore, file_token
+
+JOURNAL_COMPACT_BYTES = int(os.getenv("JOURNAL_COMPACT_BYTES", str(1024 * 1024)))
+SEQ_KEY = "_journal_seq"
+
+
+class JournalStore(JsonStore):
+    """Snapshot-Datei plus Journal mit einer JSON-Zeile pro save_db-Aufruf.
+
+    Jede Zeile enthält nur die Änderungen gegenüber dem Stand, den die
+    speichernde Sitzung geladen hatte. Wird das Journal größer als
+    ``compact_bytes``, schreibt ein Hintergrund-Thread einen neuen Snapshot und
+    kürzt das Journal.
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: str | None = None, compact_bytes: int = JOURNAL_COMPACT_BYTES):
+        super().__init__(snapshot_path)
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or f"{snapshot_path}.journal"
+        self.compact_bytes = compact_bytes
+        self._seq = 0
+        self._compacting = False
+
+    def index_token(self) -> tuple:
+        return self._version, file_token(self.snapshot_path), file_token(self.journal_path)
+
+    def _read_snapshot(self) -> tuple[dict, int]:
+        doc = read_data(self.snapshot_path)
+        if not isinstance(doc, dict):
+            return {"trips": {}}, 0
+        seq = int(doc.pop(SEQ_KEY, 0) or 0)
+        if not isinstance(doc.get("trips"), dict):
+            doc["trips"] = {}
+        return doc, seq
+
+    def _read_records(self, after_seq: int) -> list[dict]:
+        if not os.path.exists(self.journal_path):
+            return []
+        records = []
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Abgebrochene letzte Zeile nach einem Absturz.
+                    continue
+                if int(record.get("seq", 0)) > after_seq:
+                    records.append(record)
+        return records
+
+    def _read_document(self) -> dict:
+        doc, seq = self._read_snapshot()
+        records = self._read_records(seq)
+        if records:
+            doc = apply_ops(doc, [op for record in records for op in record.get("ops", [])])
+            seq = max(seq, max(int(record["seq"]) for record in records))
+        self._seq = seq
+        return doc
+
+    def _append(self, ops: list[dict]) -> int:
+        self._seq += 1
+        record = {
+            "seq": self._seq,
+            "at": datetime.datetime.now().replace(microsecond=0).isoformat(),
+            "ops": ops,
+        }
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+        with open(self.journal_path, "a+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            if end:
+                f.seek(end - 1)
+                if f.read(1) != b"\n":
+                    # Abgebrochene letzte Zeile abschließen, sonst hinge der
+                    # neue Eintrag an ihr und ginge beim Einlesen mit verloren.
+                    line = b"\n" + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        return os.path.getsize(self.journal_path)
+
+    def commit(self, changes: dict, deleted: set, meta: dict | None = None) -> dict:
+        with self._lock, file_lock(self.snapshot_path):
+            doc = self.document()
+            changes = self._rebase(doc, changes)
+            ops: list[dict] = [{"op": "trip_del", "trip": trip_key} for trip_key in deleted if trip_key in doc["trips"]]
+            for trip_key, (baseline, payload) in changes.items():
+                if baseline is None or trip_key not in doc["trips"]:
+                    ops.append({"op": "trip_put", "trip": trip_key, "value": payload})
+                else:
+                    ops.extend(diff_trip(trip_key, baseline, payload))
+            if meta is not None:
+                ops.extend({"op": "meta_del", "key": key} for key in doc if key != "trips" and key not in meta)
+                ops.extend(
+                    {"op": "meta_set", "key": key, "value": value}
+                    for key, value in meta.items()
+                    if key not in doc or doc[key] != value
+                )
+            written = {trip_key: payload for trip_key, (_baseline, payload) in changes.items()}
+            if not ops:
+                return written
+            journal_size = self._append(ops)
+            self._replace_document(apply_ops(doc, ops), {op["trip"] for op in ops if "trip" in op})
+
+        if journal_size >= self.compact_bytes:
+            self.compact_in_background()
+        return written
+
+    def reset(self) -> None:
+        with self._lock, file_lock(self.snapshot_path):
+            doc = {"trips": {}}
+            write_data_atomic(self.snapshot_path, {**doc, SEQ_KEY: self._seq})
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._replace_document(doc)
+            self._generation += 1
+
+    def compact_in_background(self) -> None:
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, name="journal-compaction", daemon=True).start()
+
+    def compact(self) -> None:
+        try:
+            with self._lock:
+                # Dokumente werden nie in-place verändert, der Verweis genügt.
+                snapshot = self.document()
+                seq = self._seq
+
+            # Der Snapshot wird außerhalb des Locks geschrieben, damit
+            # gleichzeitige save_db-Aufrufe nicht warten müssen.
+            write_data_atomic(self.snapshot_path, {**snapshot, SEQ_KEY: seq})
+
+            with self._lock, file_lock(self.snapshot_path):
+                remaining = self._read_records(seq)
+                write_bytes_atomic(
+                    self.journal_path,
+                    "".join(
+                        json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n" for record in remaining
+                    ).encode("utf-8"),
+                )
+                # Inhalt unverändert, nur die Dateien sind neu geschrieben.
+                self._replace_document(self.document() if self._doc is None else self._doc)
+        finally:
+            with self._lock:
+                self._compacting = False
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import os
+import threading
+
+from core.changes import rebase_change, trip_version
+from core.fileio import file_lock, read_data, write_data_atomic
+
+
+def file_token(path: str) -> tuple | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class JsonStore:
+    """Komplette Datenbank als eine JSON-Datei.
+
+    Das zuletzt gelesene Dokument wird behalten, solange sich Änderungszeit und
+    Größe der Datei nicht ändern. Gespeicherte Dokumente werden nie in-place
+    verändert, damit geladene Reisen als Vergleichsstand dienen können.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._doc: dict | None = None
+        self._doc_token: tuple | None = None
+        self._version = 0
+        # Wird erhöht, wenn die Datei von außen geändert und neu gelesen wurde;
+        # eigene Schreibvorgänge zählen nur die betroffenen Reisen hoch.
+        self._generation = 0
+        self._trip_versions: dict[str, int] = {}
+
+    def index_token(self) -> tuple:
+        return self._version, file_token(self.path)
+
+    def trip_token(self, trip_key: str) -> tuple:
+        with self._lock:
+            self.document()
+            return self._generation, self._trip_versions.get(trip_key, 0)
+
+    def _read_document(self) -> dict:
+        doc = read_data(self.path, {"trips": {}})
+        if not isinstance(doc, dict):
+            doc = {"trips": {}}
+        if not isinstance(doc.get("trips"), dict):
+            doc["trips"] = {}
+        return doc
+
+    def _write_document(self, doc: dict) -> None:
+        write_data_atomic(self.path, doc)
+
+    def document(self) -> dict:
+        with self._lock:
+            token = self.index_token()
+            if self._doc is None or token != self._doc_token:
+                self._doc = self._read_document()
+                self._doc_token = token
+                self._generation += 1
+            return self._doc
+
+    def load_index(self) -> dict:
+        doc = self.document()
+        return {
+            "trips": {
+                key: {"name": str(trip.get("name") or key) if isinstance(trip, dict) else str(key)}
+                for key, trip in doc["trips"].items()
+            },
+            "meta": {key: value for key, value in doc.items() if key != "trips"},
+        }
+
+    def load_trip(self, trip_key: str, index: dict | None = None) -> dict | None:
+        return self.document()["trips"].get(trip_key)
+
+    def _replace_document(self, doc: dict, trip_keys=()) -> None:
+        for trip_key in trip_keys:
+            self._trip_versions[trip_key] = self._trip_versions.get(trip_key, 0) + 1
+        self._version += 1
+        self._doc = doc
+        self._doc_token = self.index_token()
+
+    def _rebase(self, doc: dict, changes: dict) -> dict:
+        rebased = {}
+        for trip_key, (baseline, payload) in changes.items():
+            current = doc["trips"].get(trip_key)
+            rebased[trip_key] = rebase_change(
+                baseline,
+                payload,
+                None if current is None else trip_version(current),
+                lambda current=current: current,
+            )
+        return rebased
+
+    def commit(self, changes: dict, deleted: set, meta: dict | None = None) -> dict:
+        """Schreibt geänderte Reisen und gibt die tatsächlich gespeicherten Stände zurück.
+
+        Die Dateisperre hält andere Prozesse (weitere App-Worker, ``core.migrate``)
+        zwischen Lesen und Schreiben fern; ``document()`` liest danach neu ein,
+        falls sich die Datei geändert hat.
+        """
+        with self._lock, file_lock(self.path):
+            doc = self.document()
+            changes = self._rebase(doc, changes)
+            trips = dict(doc["trips"])
+            for trip_key in deleted:
+                trips.pop(trip_key, None)
+            for trip_key, (_baseline, payload) in changes.items():
+                trips[trip_key] = payload
+            if meta is None:
+                meta = {key: value for key, value in doc.items() if key != "trips"}
+            new_doc = {**meta, "trips": trips}
+            self._write_document(new_doc)
+            self._replace_document(new_doc, set(changes) | set(deleted))
+        return {trip_key: payload for trip_key, (_baseline, payload) in changes.items()}
+
+    def reset(self) -> None:
+        with self._lock, file_lock(self.path):
+            doc = {"trips": {}}
+            self._write_document(doc)
+            self._replace_document(doc)
+            self._generation += 1
@@ -0,0 +1,87 @@
+"""Einmalige Umstellung vorhandener Daten auf das aktuelle Format.
+
+Aufruf: ``python -m core.migrate schema [--force]``, ``unread [--check]``,
+``archive [--days N] [--keep N]``, ``blobs [--gc]`` bzw. ``backup``.
+Speicherort und -verfahren kommen wie in der App aus ``DB_FILE``/``STORAGE_MODE``.
+"""
+from __future__ import annotations
+
+import argparse
+
+from core import storage
+from core.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_KEEP
+
+
+def _schema(args: argparse.Namespace) -> None:
+    migrated = storage.migrate_db(force=args.force)
+    if migrated:
+        print(f"✅ {len(migrated)} Reise(n) auf Schema {storage.SCHEMA_VERSION} umgestellt: {', '.join(migrated)}")
+    else:
+        print(f"✅ Alle Reisen sind bereits auf Schema {storage.SCHEMA_VERSION}.")
+
+
+def _backup(args: argparse.Namespace) -> None:
+    path = storage.backup_db(compression=args.compression)
+    print(f"✅ Sicherung geschrieben: {path}")
+
+
+def _archive(args: argparse.Namespace) -> None:
+    moved = storage.archive_db(max_age_days=args.days, keep=args.keep)
+    if moved:
+        print("✅ Archiviert: " + ", ".join(f"{trip_key} ({count})" for trip_key, count in moved.items()))
+    else:
+        print("✅ Nichts zu archivieren.")
+
+
+def _blobs(args: argparse.Namespace) -> None:
+    moved, removed = storage.migrate_blobs_db(collect=args.gc)
+    if moved:
+        print("✅ Fotos in den Blob-Speicher verschoben: " + ", ".join(f"{trip_key} ({count})" for trip_key, count in moved.items()))
+    else:
+        print("✅ Keine base64-Fotos mehr in den Reisen.")
+    if args.gc:
+        print(f"✅ {len(removed)} unbenutzte Datei(en) gelöscht.")
+
+
+def _unread(args: argparse.Namespace) -> None:
+    trips = storage.rebuild_unread_db(check_only=args.check)
+    if not trips:
+        print("✅ Alle Ungelesen-Zähler stimmen.")
+    elif args.check:
+        print(f"⚠️ Abweichende Zähler in: {', '.join(trips)}")
+        raise SystemExit(1)
+    else:
+        print(f"✅ Zähler neu ausgezählt für: {', '.join(trips)}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m core.migrate", description="Datenbestand migrieren")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    schema = commands.add_parser("schema", help="alle Reisen normalisieren und mit Schema-Version versehen")
+    schema.add_argument("--force", action="store_true", help="auch bereits gestempelte Reisen neu normalisieren")
+    schema.set_defaults(func=_schema)
+
+    unread = commands.add_parser("unread", help="Ungelesen-Zähler prüfen und neu auszählen")
+    unread.add_argument("--check", action="store_true", help="nur prüfen, nichts schreiben")
+    unread.set_defaults(func=_unread)
+
+    archive = commands.add_parser("archive", help="alte Chat-Nachrichten in komprimierte Archivsegmente verschieben")
+    archive.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="Nachrichten älter als so viele Tage")
+    archive.add_argument("--keep", type=int, default=ARCHIVE_KEEP, help="so viele neueste Nachrichten behalten")
+    archive.set_defaults(func=_archive)
+
+    blobs = commands.add_parser("blobs", help="base64-Fotos in den Blob-Speicher verschieben, Zähler neu auszählen")
+    blobs.add_argument("--gc", action="store_true", help="unbenutzte Dateien löschen")
+    blobs.set_defaults(func=_blobs)
+
+    backup = commands.add_parser("backup", help="Snapshot (Standard: gzip) nach BACKUP_FOLDER schreiben")
+    backup.add_argument("--compression", choices=["none", "gzip", "zstd"], default="gzip")
+    backup.set_defaults(func=_backup)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
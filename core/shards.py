@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+
+from core.changes import rebase_change, trip_version
+from core.fileio import file_lock, read_data, write_data_atomic
+from core.json_store import file_token
+
+INDEX_FILE = "index.json"
+
+
+def _trip_file_name(trip_key: str) -> str:
+    slug = re.sub(r"[^a-zA-Z0-9_-]+", "-", str(trip_key)).strip("-").lower()[:40] or "trip"
+    digest = hashlib.sha1(str(trip_key).encode("utf-8")).hexdigest()[:8]
+    return f"{slug}-{digest}.json"
+
+
+class ShardedStore:
+    """Eine JSON-Datei pro Reise plus ``index.json`` mit Reise-IDs und Namen.
+
+    Der Index ist klein und wird bei jedem Lauf gelesen; eine Reise wird erst
+    geladen, wenn sie tatsächlich gebraucht wird.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self._lock = threading.RLock()
+        # Zähler für Schreibvorgänge dieses Prozesses, falls die Änderungszeit
+        # der Datei zu grob aufgelöst ist.
+        self._version = 0
+        self._trip_versions: dict[str, int] = {}
+
+    def index_token(self) -> tuple:
+        return self._version, file_token(self.index_path)
+
+    def trip_token(self, trip_key: str) -> tuple:
+        return self._trip_versions.get(trip_key, 0), file_token(self._trip_path(trip_key))
+
+    def exists(self) -> bool:
+        return os.path.exists(self.index_path)
+
+    def load_index(self) -> dict:
+        index = read_data(self.index_path, {})
+        if not isinstance(index, dict):
+            index = {}
+        if not isinstance(index.get("trips"), dict):
+            index["trips"] = {}
+        if not isinstance(index.get("meta"), dict):
+            index["meta"] = {}
+        return index
+
+    def _trip_path(self, trip_key: str) -> str:
+        return os.path.join(self.directory, _trip_file_name(trip_key))
+
+    def load_trip(self, trip_key: str, index: dict | None = None) -> dict | None:
+        index = index or self.load_index()
+        entry = index["trips"].get(trip_key)
+        if entry is None:
+            return None
+        trip = read_data(self._trip_path(trip_key))
+        return trip if isinstance(trip, dict) else {"name": entry.get("name", trip_key)}
+
+    def commit(self, changes: dict, deleted: set, meta: dict | None = None) -> dict:
+        # Die Dateisperre am Index hält andere Prozesse zwischen Lesen und Schreiben fern.
+        with self._lock, file_lock(self.index_path):
+            index = self.load_index()
+            written = {}
+            for trip_key, (baseline, payload) in changes.items():
+                current = self.load_trip(trip_key, index)
+                _baseline, written[trip_key] = rebase_change(
+                    baseline,
+                    payload,
+                    None if current is None else trip_version(current),
+                    lambda current=current: current,
+                )
+            self._write(written, deleted, meta)
+        return written
+
+    def write(self, trips: dict, deleted: set | None = None, meta: dict | None = None) -> None:
+        with self._lock, file_lock(self.index_path):
+            self._write(trips, deleted, meta)
+
+    def _write(self, trips: dict, deleted: set | None = None, meta: dict | None = None) -> None:
+        deleted = deleted or set()
+        index = self.load_index()
+        index_changed = False
+        for trip_key, trip in trips.items():
+            entry = index["trips"].get(trip_key)
+            name = str(trip.get("name") or trip_key) if isinstance(trip, dict) else str(trip_key)
+            if entry is None:
+                entry = {"name": name}
+                index["trips"][trip_key] = entry
+                index_changed = True
+            elif entry.get("name") != name:
+                entry["name"] = name
+                index_changed = True
+            write_data_atomic(self._trip_path(trip_key), trip)
+            self._trip_versions[trip_key] = self._trip_versions.get(trip_key, 0) + 1
+        for trip_key in deleted:
+            entry = index["trips"].pop(trip_key, None)
+            if entry is None:
+                continue
+            index_changed = True
+            self._trip_versions[trip_key] = self._trip_versions.get(trip_key, 0) + 1
+            path = self._trip_path(trip_key)
+            if os.path.exists(path):
+                os.remove(path)
+        if meta is not None and meta != index["meta"]:
+            index["meta"] = meta
+            index_changed = True
+        if index_changed or not self.exists():
+            write_data_atomic(self.index_path, index)
+            self._version += 1
+
+    def reset(self) -> None:
+        with self._lock, file_lock(self.index_path):
+            self._version += 1
+            index = self.load_index()
+            for trip_key in index["trips"]:
+                self._trip_versions[trip_key] = self._trip_versions.get(trip_key, 0) + 1
+                path = self._trip_path(trip_key)
+                if os.path.exists(path):
+                    os.remove(path)
+            write_data_atomic(self.index_path, {"trips": {}, "meta": {}})
+
+    def import_document(self, doc: dict) -> None:
+        trips = doc.get("trips") if isinstance(doc.get("trips"), dict) else {}
+        meta = {key: value for key, value in doc.items() if key != "trips"}
+        self.write(trips, meta=meta)
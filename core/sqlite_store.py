@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Callable
+
+from core.changes import LEGACY_CHAT_FIELD, diff_trip, rebase_change, trip_messages
+
+# Sammlungen einer Reise, die als eigene Tabellen mit einer Zeile pro Eintrag
+# abgelegt werden. "participants" ist ein Dict (Name -> Daten), die übrigen sind
+# Listen mit "id".
+ITEM_TABLES = {
+    "messages": "created_at",
+    "tasks": "updated_at",
+    "expenses": "created_at",
+    "images": "date",
+}
+ENTITY_FIELDS = set(ITEM_TABLES) | {"participants"}
+# Altlast aus Formatversion 1; der Inhalt landet beim Import in "messages".
+SKIPPED_FIELDS = {LEGACY_CHAT_FIELD}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trips (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    doc TEXT NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE TABLE IF NOT EXISTS revisions (
+    trip_id TEXT PRIMARY KEY,
+    rev INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS participants (
+    trip_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (trip_id, id)
+);
+"""
+
+ITEM_TABLE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    trip_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    ts TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL,
+    PRIMARY KEY (trip_id, id)
+);
+CREATE INDEX IF NOT EXISTS idx_{table}_trip_seq ON {table} (trip_id, seq);
+CREATE INDEX IF NOT EXISTS idx_{table}_trip_ts ON {table} (trip_id, ts);
+"""
+
+
+def sqlite_path_from_url(url: str) -> str | None:
+    if not url.startswith("sqlite:///"):
+        return None
+    return url[len("sqlite:///"):]
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _item_id(item, position: int) -> str:
+    item_id = item.get("id") if isinstance(item, dict) else None
+    return str(item_id) if item_id else f"_pos{position}"
+
+
+def _item_ts(table: str, item) -> str:
+    if not isinstance(item, dict):
+        return ""
+    return str(item.get(ITEM_TABLES[table]) or item.get("created_at") or item.get("time") or "")
+
+
+class SqliteStore:
+    """Reisen in SQLite mit eigenen Tabellen für Teilnehmer, Nachrichten,
+    Aufgaben, Ausgaben und Bilder.
+
+    Schreibzugriffe kommen als Änderungsliste aus ``core.changes`` an, sodass
+    z. B. eine neue Chatnachricht genau eine neue Zeile erzeugt.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._created = not os.path.exists(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.executescript(SCHEMA + "".join(ITEM_TABLE_SCHEMA.format(table=t) for t in ITEM_TABLES))
+
+    @property
+    def created(self) -> bool:
+        return self._created
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=OFF")
+            self._local.conn = conn
+        return conn
+
+    def _revision(self, trip_id: str) -> int:
+        row = self._conn().execute("SELECT rev FROM revisions WHERE trip_id = ?", (trip_id,)).fetchone()
+        return row[0] if row else 0
+
+    def index_token(self) -> tuple:
+        # "" steht für den Gesamtstand, jede Reise hat zusätzlich einen eigenen.
+        return (self._revision(""),)
+
+    def trip_token(self, trip_key: str) -> tuple:
+        return (self._revision(trip_key),)
+
+    def load_index(self) -> dict:
+        conn = self._conn()
+        trips = {
+            row[0]: {"name": row[1]}
+            for row in conn.execute("SELECT id, name FROM trips ORDER BY position")
+        }
+        meta = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM meta")}
+        return {"trips": trips, "meta": meta}
+
+    def load_trip(self, trip_key: str, index: dict | None = None) -> dict | None:
+        conn = self._conn()
+        row = conn.execute("SELECT doc FROM trips WHERE id = ?", (trip_key,)).fetchone()
+        if row is None:
+            return None
+        trip = json.loads(row[0])
+        trip["participants"] = {
+            pid: json.loads(data)
+            for pid, data in conn.execute(
+                "SELECT id, data FROM participants WHERE trip_id = ? ORDER BY position", (trip_key,)
+            )
+        }
+        for table in ITEM_TABLES:
+            trip[table] = [
+                json.loads(data)
+                for (data,) in conn.execute(f"SELECT data FROM {table} WHERE trip_id = ? ORDER BY seq", (trip_key,))
+            ]
+        return trip
+
+    # -- Schreiben -----------------------------------------------------------
+
+    def commit(self, changes: dict, deleted: set, meta: dict | None = None) -> dict:
+        written = {}
+
+        def build(conn: sqlite3.Connection) -> list[dict]:
+            # Läuft innerhalb der Schreibtransaktion, damit Versionsprüfung und
+            # Schreiben nicht von einem anderen Prozess unterbrochen werden.
+            ops: list[dict] = [{"op": "trip_del", "trip": trip_key} for trip_key in deleted]
+            for trip_key, (baseline, payload) in changes.items():
+                row = conn.execute("SELECT json_extract(doc, '$.version') FROM trips WHERE id = ?", (trip_key,)).fetchone()
+                baseline, payload = rebase_change(
+                    baseline,
+                    payload,
+                    None if row is None else int(row[0] or 0),
+                    lambda trip_key=trip_key: self.load_trip(trip_key),
+                )
+                written[trip_key] = payload
+                if baseline is None:
+                    ops.append({"op": "trip_put", "trip": trip_key, "value": payload})
+                else:
+                    ops.extend(diff_trip(trip_key, baseline, payload))
+            if meta is not None:
+                stored_meta = self.load_index()["meta"]
+                ops.extend({"op": "meta_del", "key": key} for key in stored_meta if key not in meta)
+                ops.extend(
+                    {"op": "meta_set", "key": key, "value": value}
+                    for key, value in meta.items()
+                    if key not in stored_meta or stored_meta[key] != value
+                )
+            return ops
+
+        self._transaction(build)
+        return written
+
+    def apply(self, ops: list[dict]) -> None:
+        if ops:
+            self._transaction(lambda conn: ops)
+
+    def _transaction(self, build: Callable[[sqlite3.Connection], list[dict]]) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ops = build(conn)
+            for op in ops:
+                self._apply_op(conn, op)
+            if ops:
+                touched = {""} | {op["trip"] for op in ops if "trip" in op}
+                conn.executemany(
+                    "INSERT INTO revisions (trip_id, rev) VALUES (?, 1) "
+                    "ON CONFLICT(trip_id) DO UPDATE SET rev = rev + 1",
+                    [(trip_id,) for trip_id in touched],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _apply_op(self, conn: sqlite3.Connection, op: dict) -> None:
+        kind = op.get("op")
+        if kind == "meta_set":
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (op["key"], _dumps(op["value"])),
+            )
+        elif kind == "meta_del":
+            conn.execute("DELETE FROM meta WHERE key = ?", (op["key"],))
+        elif kind == "trip_put":
+            row = conn.execute("SELECT position FROM trips WHERE id = ?", (op["trip"],)).fetchone()
+            self._delete_trip(conn, op["trip"])
+            self._insert_trip(conn, op["trip"], op["value"], position=row[0] if row else None)
+        elif kind == "trip_del":
+            self._delete_trip(conn, op["trip"])
+        elif op.get("field") in SKIPPED_FIELDS:
+            return
+        elif kind in {"field_set", "field_del"}:
+            field = op["field"]
+            value = op.get("value") if kind == "field_set" else None
+            if field == "participants":
+                self._replace_participants(conn, op["trip"], value or {})
+            elif field in ITEM_TABLES:
+                self._replace_items(conn, field, op["trip"], value or [])
+            else:
+                self._update_doc(conn, op["trip"], field, value, delete=kind == "field_del")
+        elif kind == "item_put" and op["field"] in ITEM_TABLES:
+            table = op["field"]
+            item = op["value"]
+            conn.execute(
+                f"INSERT INTO {table} (trip_id, id, seq, ts, data) "
+                f"VALUES (?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM {table} WHERE trip_id = ?), ?, ?) "
+                "ON CONFLICT(trip_id, id) DO UPDATE SET ts = excluded.ts, data = excluded.data",
+                (op["trip"], _item_id(item, 0), op["trip"], _item_ts(table, item), _dumps(item)),
+            )
+        elif kind == "item_del" and op["field"] in ITEM_TABLES:
+            conn.execute(f"DELETE FROM {op['field']} WHERE trip_id = ? AND id = ?", (op["trip"], op["id"]))
+
+    def _insert_trip(self, conn: sqlite3.Connection, trip_key: str, trip: dict, position: int | None = None) -> None:
+        if not isinstance(trip, dict):
+            trip = {"name": str(trip_key)}
+        doc = {key: value for key, value in trip.items() if key not in ENTITY_FIELDS and key not in SKIPPED_FIELDS}
+        if position is None:
+            position = conn.execute("SELECT COALESCE(MAX(position), 0) + 1 FROM trips").fetchone()[0]
+        conn.execute(
+            "INSERT INTO trips (id, position, name, doc, updated_at) VALUES (?, ?, ?, ?, datetime('now'))",
+            (trip_key, position, str(trip.get("name") or trip_key), _dumps(doc)),
+        )
+        self._replace_participants(conn, trip_key, trip.get("participants") or {})
+        for table in ITEM_TABLES:
+            items = trip_messages(trip) if table == "messages" else trip.get(table)
+            self._replace_items(conn, table, trip_key, items or [])
+
+    def _delete_trip(self, conn: sqlite3.Connection, trip_key: str) -> None:
+        conn.execute("DELETE FROM trips WHERE id = ?", (trip_key,))
+        conn.execute("DELETE FROM participants WHERE trip_id = ?", (trip_key,))
+        for table in ITEM_TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE trip_id = ?", (trip_key,))
+
+    def _replace_participants(self, conn: sqlite3.Connection, trip_key: str, participants) -> None:
+        conn.execute("DELETE FROM participants WHERE trip_id = ?", (trip_key,))
+        if not isinstance(participants, dict):
+            return
+        conn.executemany(
+            "INSERT INTO participants (trip_id, id, position, data) VALUES (?, ?, ?, ?)",
+            [(trip_key, str(pid), pos, _dumps(meta)) for pos, (pid, meta) in enumerate(participants.items())],
+        )
+
+    def _replace_items(self, conn: sqlite3.Connection, table: str, trip_key: str, items) -> None:
+        conn.execute(f"DELETE FROM {table} WHERE trip_id = ?", (trip_key,))
+        if not isinstance(items, list):
+            return
+        rows = {}
+        for pos, item in enumerate(items):
+            rows[_item_id(item, pos)] = (trip_key, _item_id(item, pos), pos + 1, _item_ts(table, item), _dumps(item))
+        conn.executemany(f"INSERT INTO {table} (trip_id, id, seq, ts, data) VALUES (?, ?, ?, ?, ?)", list(rows.values()))
+
+    def _update_doc(self, conn: sqlite3.Connection, trip_key: str, field: str, value, delete: bool = False) -> None:
+        row = conn.execute("SELECT doc FROM trips WHERE id = ?", (trip_key,)).fetchone()
+        if row is None:
+            self._insert_trip(conn, trip_key, {} if delete else {field: value})
+            return
+        doc = json.loads(row[0])
+        if delete:
+            doc.pop(field, None)
+        else:
+            doc[field] = value
+        conn.execute(
+            "UPDATE trips SET doc = ?, name = ?, updated_at = datetime('now') WHERE id = ?",
+            (_dumps(doc), str(doc.get("name") or trip_key), trip_key),
+        )
+
+    def import_document(self, doc: dict) -> None:
+        self.apply(
+            [{"op": "meta_set", "key": key, "value": value} for key, value in doc.items() if key != "trips"]
+            + [{"op": "trip_put", "trip": key, "value": trip} for key, trip in (doc.get("trips") or {}).items()]
+        )
+
+    def reset(self) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM meta")
+            conn.execute("UPDATE revisions SET rev = rev + 1")
+            conn.execute("INSERT OR IGNORE INTO revisions (trip_id, rev) VALUES ('', 1)")
+            conn.execute("DELETE FROM trips")
+            conn.execute("DELETE FROM participants")
+            for table in ITEM_TABLES:
+                conn.execute(f"DELETE FROM {table}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
@@ -1,45 +1,443 @@
 from __future__ import annotations
 
+import bisect
 import datetime
-import json
 import os
+import pickle
+import threading
 import uuid
+from collections import Counter, deque
+from collections.abc import Iterator, MutableMapping
 from copy import deepcopy
+from typing import Callable
+
+from core.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_KEEP, archive_trip, remove_segments
+from core.blobstore import blob_store, extract_images, image_refs
+from core.changes import FORMAT_VERSION, ITEM_COLLECTIONS, LEGACY_CHAT_FIELD, MERGE_HOOKS, trip_messages, trip_version
+from core.config import BACKUP_FOLDER, MAX_BACKUPS
+from core.fileio import write_backup
+from core.images import add_thumbnails
+from core.journal import JournalStore
+from core.json_store import JsonStore
+from core.shards import ShardedStore
+from core.sqlite_store import SqliteStore, sqlite_path_from_url
 
 DB_FILE = os.getenv("DB_FILE", "data/reisen_daten.json")
+# "json": komplette Datei pro Speichern, "journal": Snapshot + Änderungsjournal,
+# "sharded": eine Datei pro Reise unter SHARD_DIR plus Index.
+# DB_FILE=sqlite:///pfad.db wählt automatisch den SQLite-Speicher.
+STORAGE_MODE = "sqlite" if sqlite_path_from_url(DB_FILE) else os.getenv("STORAGE_MODE", "json").strip().lower()
+SHARD_DIR = os.getenv("SHARD_DIR", "data/trips")
+# Wird beim ersten Anlegen der SQLite-Datenbank übernommen, falls vorhanden.
+SQLITE_IMPORT_FILE = os.getenv("SQLITE_IMPORT_FILE", "data/reisen_daten.json")
+# Stand von normalize_trip. Reisen mit diesem Stempel werden beim Laden nicht
+# erneut normalisiert; bei Änderungen an den _normalize_*-Funktionen erhöhen.
+SCHEMA_VERSION = 3
+
+_store: JsonStore | ShardedStore | SqliteStore | None = None
+_store_config: tuple | None = None
+_store_lock = threading.Lock()
+
+# Prozessweiter Cache, den sich alle Streamlit-Sitzungen teilen:
+# Index (Reise-IDs, Namen, Meta) und pro Reise (Token, gespeicherter Stand,
+# normalisierter Stand als Pickle). Ob ein Eintrag noch gilt, entscheidet das Token des
+# Speichers (Schreibzähler, Änderungszeit bzw. Revision), ohne Daten zu lesen.
+_cache_lock = threading.Lock()
+_index_cache: dict = {}
+_trip_cache: dict[str, tuple] = {}
+
+# Werden nach jedem Speichern mit (trip_key, gespeicherte Reise oder None
+# bei Löschung) aufgerufen, z. B. um abgeleitete Indizes nachzuführen.
+_commit_listeners: list[Callable[[str, dict | None], None]] = []
+
+# Pro Reise die letzten Speichervorgänge dieses Prozesses als (Version, geänderte
+# (Liste, ID)-Paare) für changes_since. Ältere Cursor bekommen "unvollständig".
+CHANGELOG_SIZE = int(os.getenv("CHANGELOG_SIZE", "200"))
+_changelog: dict[str, deque] = {}
+
+
+def _open_store() -> JsonStore | ShardedStore | SqliteStore:
+    if STORAGE_MODE == "sqlite":
+        store = SqliteStore(sqlite_path_from_url(DB_FILE))
+        if store.created and os.path.exists(SQLITE_IMPORT_FILE):
+            store.import_document(JsonStore(SQLITE_IMPORT_FILE).document())
+        return store
+    if STORAGE_MODE == "sharded":
+        store = ShardedStore(SHARD_DIR)
+        if not store.exists():
+            # Einmalige Übernahme der bisherigen Gesamtdatei.
+            store.import_document(JsonStore(DB_FILE).document())
+        return store
+    if STORAGE_MODE == "journal":
+        return JournalStore(DB_FILE)
+    return JsonStore(DB_FILE)
+
+
+def _get_store() -> JsonStore | ShardedStore | SqliteStore:
+    global _store, _store_config
+    config = (STORAGE_MODE, DB_FILE, SHARD_DIR)
+    with _store_lock:
+        if _store is None or _store_config != config:
+            _store = _open_store()
+            _store_config = config
+            _invalidate_cache()
+        return _store
+
+
+def _invalidate_cache(trip_keys: set[str] | None = None) -> None:
+    with _cache_lock:
+        _index_cache.clear()
+        if trip_keys is None:
+            _trip_cache.clear()
+        else:
+            for trip_key in trip_keys:
+                _trip_cache.pop(trip_key, None)
+
+
+def subscribe(listener: Callable[[str, dict | None], None]) -> None:
+    if listener not in _commit_listeners:
+        _commit_listeners.append(listener)
+
+
+def _changed_items(baseline: dict | None, trip: dict) -> frozenset | None:
+    """(Liste, ID) der geänderten Einträge bzw. ("fields", Name) sonstiger Felder.
+
+    ``None``, wenn es keinen Vergleichsstand gibt.
+    """
+    if not isinstance(baseline, dict):
+        return None
+    changed = set()
+    for field in baseline.keys() | trip.keys():
+        if field == "version" or baseline.get(field) == trip.get(field):
+            continue
+        if field not in ITEM_COLLECTIONS:
+            changed.add(("fields", field))
+            continue
+        before = {item.get("id"): item for item in baseline.get(field) or [] if isinstance(item, dict)}
+        after = {item.get("id"): item for item in trip.get(field) or [] if isinstance(item, dict)}
+        changed.update(
+            (field, item_id)
+            for item_id in before.keys() | after.keys()
+            if before.get(item_id) != after.get(item_id)
+        )
+    return frozenset(changed)
+
+
+def _notify(written: dict, deleted: set, changes: dict | None = None) -> None:
+    with _cache_lock:
+        for trip_key, payload in written.items():
+            baseline = (changes or {}).get(trip_key, (None, None))[0]
+            log = _changelog.setdefault(trip_key, deque(maxlen=CHANGELOG_SIZE))
+            log.append((trip_version(payload), _changed_items(baseline, payload)))
+        for trip_key in deleted:
+            _changelog.pop(trip_key, None)
+    for listener in list(_commit_listeners):
+        for trip_key, payload in written.items():
+            listener(trip_key, payload)
+        for trip_key in deleted:
+            listener(trip_key, None)
+
+
+def _cached_index(store) -> dict:
+    token = store.index_token()
+    with _cache_lock:
+        if _index_cache.get("token") == token:
+            return _index_cache["index"]
+    index = store.load_index()
+    with _cache_lock:
+        _index_cache.update(token=token, index=index)
+    return index
+
+
+def _cached_trip(store, trip_key: str, index: dict) -> tuple[dict | None, bytes | None]:
+    """Gespeicherter Stand einer Reise und ihre normalisierte Fassung als Pickle.
+
+    Das Pickle ist die Vorlage für die Kopie jeder Sitzung: ``pickle.loads``
+    baut die Reise mehrfach schneller auf als ``deepcopy`` des Objekts.
+    """
+    token = store.trip_token(trip_key)
+    with _cache_lock:
+        entry = _trip_cache.get(trip_key)
+        if entry is not None and entry[0] == token:
+            return entry[1], entry[2]
+    raw = store.load_trip(trip_key, index)
+    if raw is None:
+        return None, None
+    normalized = pickle.dumps(normalize_trip(trip_key, deepcopy(raw)), pickle.HIGHEST_PROTOCOL)
+    with _cache_lock:
+        _trip_cache[trip_key] = (token, raw, normalized)
+    return raw, normalized
+
+
+class TripMap(MutableMapping):
+    """Reisen einer Sitzung, die erst beim ersten Zugriff geladen werden.
+
+    Schlüssel, Länge und ``in`` kommen aus dem Index, ohne eine Reise zu lesen.
+    Jede geladene Reise ist eine eigene Kopie aus dem gemeinsamen Cache, die
+    Sitzung kann sie also frei verändern; der Cache hält dafür nur die
+    serialisierte Fassung. Der gespeicherte Stand bleibt als
+    Vergleichsgrundlage für save_db erhalten; seine ``version`` zeigt beim
+    Speichern, ob eine andere Sitzung die Reise inzwischen geändert hat.
+    """
+
+    def __init__(self, store, index: dict):
+        self._store = store
+        self._index = index
+        self._loaded: dict[str, dict] = {}
+        self._baseline: dict[str, dict | None] = {}
+        self._deleted: set[str] = set()
+
+    def __getitem__(self, trip_key: str) -> dict:
+        if trip_key in self._loaded:
+            return self._loaded[trip_key]
+        if trip_key not in self._index["trips"]:
+            raise KeyError(trip_key)
+        raw, normalized = _cached_trip(self._store, trip_key, self._index)
+        if normalized is None:
+            trip = normalize_trip(trip_key, {"name": self._index["trips"][trip_key].get("name") or trip_key})
+        else:
+            trip = pickle.loads(normalized)
+        self._baseline[trip_key] = raw
+        self._loaded[trip_key] = trip
+        return trip
+
+    def __setitem__(self, trip_key: str, trip: dict) -> None:
+        self._loaded[trip_key] = trip
+        self._baseline.setdefault(trip_key, None)
+        self._index["trips"].setdefault(trip_key, {})["name"] = str(trip.get("name") or trip_key)
+        self._deleted.discard(trip_key)
+
+    def __delitem__(self, trip_key: str) -> None:
+        if trip_key not in self._index["trips"]:
+            raise KeyError(trip_key)
+        self._loaded.pop(trip_key, None)
+        self._baseline.pop(trip_key, None)
+        self._index["trips"].pop(trip_key, None)
+        self._deleted.add(trip_key)
+
+    def __contains__(self, trip_key: object) -> bool:
+        return trip_key in self._index["trips"]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._index["trips"]))
+
+    def __len__(self) -> int:
+        return len(self._index["trips"])
+
+    def names(self) -> dict[str, str]:
+        return {key: str(entry.get("name") or key) for key, entry in self._index["trips"].items()}
+
+    def loaded(self) -> dict[str, dict]:
+        return dict(self._loaded)
+
+    def baseline(self, trip_key: str) -> dict | None:
+        return self._baseline.get(trip_key)
+
+    def set_baseline(self, trip_key: str, trip: dict) -> None:
+        """Setzt den gespeicherten Stand und übernimmt ihn in die geladene Reise.
+
+        Nach einem Merge enthält der gespeicherte Stand auch Änderungen anderer
+        Sitzungen; die Reise wird in-place aktualisiert, damit bestehende
+        Verweise der UI (z. B. auf ``trip["messages"]`` oder eine Nachricht)
+        gültig bleiben und den neuen Stand zeigen.
+        """
+        self._baseline[trip_key] = trip
+        loaded = self._loaded.get(trip_key)
+        if loaded is not None and loaded != trip:
+            _update_in_place(loaded, trip)
+
+    def pop_deleted(self) -> set[str]:
+        deleted, self._deleted = self._deleted, set()
+        return deleted
+
+
+def _update_in_place(target, source):
+    """Bringt ``target`` auf den Stand von ``source`` und behält dabei die Objekte.
+
+    Gibt das aktualisierte Objekt zurück; nur wenn sich der Typ ändert, ist es
+    eine Kopie von ``source``. Einträge mit ``id`` werden über die ID
+    wiederverwendet, unveränderte Teile nicht angefasst.
+    """
+    if isinstance(target, dict) and isinstance(source, dict):
+        for key in [key for key in target if key not in source]:
+            del target[key]
+        for key, value in source.items():
+            if key not in target:
+                target[key] = deepcopy(value)
+            elif target[key] != value:
+                target[key] = _update_in_place(target[key], value)
+        return target
+    if isinstance(target, list) and isinstance(source, list):
+        if target == source:
+            return target
+        by_id = {
+            item["id"]: item
+            for item in target
+            if isinstance(item, dict) and item.get("id") is not None
+        }
+        target[:] = [
+            _update_in_place(by_id.pop(item["id"]), item)
+            if isinstance(item, dict) and item.get("id") in by_id
+            else deepcopy(item)
+            for item in source
+        ]
+        return target
+    return deepcopy(source)
+
+
+def changes_since(trip_key: str, cursor: int | None) -> dict:
+    """Was sich an einer Reise seit ``cursor`` geändert hat.
+
+    Der Cursor ist die ``version`` der Reise. Ergebnis::
+
+        {"cursor": aktuelle Version oder None (Reise gelöscht),
+         "changes": {"messages": [IDs], "tasks": [IDs], ..., "fields": [Feldnamen]},
+         "complete": False, wenn Einzelheiten fehlen (z. B. von einem anderen Prozess)}
+
+    Ist nichts geändert, liest der Aufruf nur die Tokens des Speichers und ist
+    damit billig genug für häufiges Abfragen.
+    """
+    store = _get_store()
+    index = _cached_index(store)
+    if trip_key not in index["trips"]:
+        return {"cursor": None, "changes": {}, "complete": cursor is None}
+    raw, _normalized = _cached_trip(store, trip_key, index)
+    version = trip_version(raw)
+    result = {"cursor": version, "changes": {}, "complete": True}
+    if cursor is None or cursor == version:
+        return result
+    with _cache_lock:
+        log = list(_changelog.get(trip_key) or ())
+    entries = {entry_version: items for entry_version, items in log if cursor < entry_version <= version}
+    if cursor > version or any(entries.get(v) is None for v in range(cursor + 1, version + 1)):
+        result["complete"] = False
+        return result
+    for items in entries.values():
+        for field, item_id in items:
+            result["changes"].setdefault(field, set()).add(item_id)
+    result["changes"] = {field: sorted(ids, key=str) for field, ids in result["changes"].items()}
+    return result
+
+
+def trip_names(data: dict) -> dict[str, str]:
+    trips = data.get("trips", {})
+    if isinstance(trips, TripMap):
+        return trips.names()
+    return {
+        key: str(trip.get("name") or key) if isinstance(trip, dict) else str(key)
+        for key, trip in trips.items()
+    }
+
 
 def reset_db() -> dict:
-    data = {"trips": {}}
-    os.makedirs(os.path.dirname(DB_FILE) or ".", exist_ok=True)
-    with open(DB_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    return data
+    store = _get_store()
+    trip_keys = list(_cached_index(store)["trips"])
+    store.reset()
+    _invalidate_cache()
+    for trip_key in trip_keys:
+        remove_segments(trip_key, None, None)
+    # Alle Fotos sind jetzt unbenutzt; gelöscht werden sie erst von collect.
+    blob_store().rebuild({})
+    return {"trips": {}}
 
 
 def load_db() -> dict:
-    if not os.path.exists(DB_FILE):
-        return {"trips": {}}
-    try:
-        with open(DB_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {"trips": {}}
-
-
-def _prepare_for_save(data: dict) -> dict:
-    payload = deepcopy(data)
-    trips = payload.setdefault("trips", {})
-    for trip in trips.values():
-        messages = trip.setdefault("messages", [])
-        trip["chat"] = deepcopy(messages)
+    store = _get_store()
+    index = _cached_index(store)
+    session_index = {"trips": {key: dict(entry) for key, entry in index["trips"].items()}}
+    return {**deepcopy(index["meta"]), "trips": TripMap(store, session_index)}
+
+
+def _prepare_trip_for_save(trip_key: str, trip: dict, baseline: dict | None = None) -> dict:
+    payload = deepcopy(trip)
+    if not isinstance(payload, dict) or payload.get("schema_version") != SCHEMA_VERSION:
+        return normalize_trip(trip_key, payload)
+    # Die Reise ist bereits normalisiert; nur neue oder geänderte Einträge
+    # können noch Rohdaten enthalten.
+    for field, normalize in (
+        ("messages", _normalize_message),
+        ("tasks", _normalize_task),
+        ("expenses", _normalize_expense),
+    ):
+        items = trip_messages(payload) if field == "messages" else payload.get(field)
+        before = {
+            item.get("id"): item
+            for item in ((baseline or {}).get(field) or [])
+            if isinstance(item, dict)
+        }
+        payload[field] = [
+            item if isinstance(item, dict) and before.get(item.get("id")) == item else normalize(item)
+            for item in (items if isinstance(items, list) else [])
+        ]
+    payload.pop(LEGACY_CHAT_FIELD, None)
+    _update_unread(baseline, payload)
     return payload
 
 
+def _dirty_trips(trips: TripMap) -> dict[str, tuple[dict | None, dict]]:
+    """Geladene Reisen, die sich gegenüber dem zuletzt gespeicherten Stand geändert haben."""
+    changes = {}
+    for trip_key, trip in trips.loaded().items():
+        baseline = trips.baseline(trip_key)
+        if baseline is not None and trip == baseline:
+            continue
+        changes[trip_key] = (baseline, _prepare_trip_for_save(trip_key, trip, baseline))
+    return changes
+
+
+def _blob_deltas(changes: dict, removed: list) -> Counter:
+    """Änderung der Foto-Referenzen durch die eigenen Änderungen dieser Sitzung.
+
+    Verglichen wird mit dem geladenen Stand, nicht mit dem Ergebnis eines
+    Merges, damit Fotos anderer Sitzungen nicht doppelt gezählt werden.
+    """
+    deltas: Counter = Counter()
+    for baseline, payload in changes.values():
+        deltas.update(image_refs(payload.get("images")))
+        deltas.subtract(image_refs((baseline or {}).get("images")))
+    for trip in removed:
+        deltas.subtract(image_refs((trip or {}).get("images")))
+    return deltas
+
+
 def save_db(data: dict) -> None:
-    os.makedirs(os.path.dirname(DB_FILE) or ".", exist_ok=True)
-    payload = _prepare_for_save(data)
-    with open(DB_FILE, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2, ensure_ascii=False)
+    """Speichert nur, was sich seit dem Laden geändert hat.
+
+    Die UI verändert die Reisen direkt und ruft danach save_db auf. Welche
+    Reisen und Listen betroffen sind, ergibt sich aus dem Vergleich mit dem
+    geladenen Stand; unveränderte Reisen werden weder kopiert noch
+    geschrieben, Journal und SQLite schreiben nur die geänderten Einträge.
+    """
+    store = _get_store()
+    trips = data.get("trips", {})
+    meta = {key: deepcopy(value) for key, value in data.items() if key != "trips"}
+    meta["format_version"] = FORMAT_VERSION
+    meta["schema_version"] = SCHEMA_VERSION
+    if isinstance(trips, TripMap):
+        deleted = trips.pop_deleted()
+        changes = _dirty_trips(trips)
+    else:
+        deleted = set(_cached_index(store)["trips"]) - set(trips)
+        changes = {trip_key: (None, _prepare_trip_for_save(trip_key, trip)) for trip_key, trip in trips.items()}
+    if meta == _cached_index(store)["meta"]:
+        meta = None
+    if not changes and not deleted and meta is None:
+        return
+    index = _cached_index(store)
+    removed = [store.load_trip(trip_key, index) for trip_key in deleted if trip_key in index["trips"]]
+    written = store.commit(changes, deleted, meta)
+    _invalidate_cache(set(changes) | deleted)
+    blob_store().adjust(_blob_deltas(changes, removed))
+    # Archivsegmente gelöschter Reisen und geleerter Chats; maßgeblich ist der
+    # geschriebene Stand, der nach einem Merge noch Segmente führen kann.
+    for trip_key, payload in written.items():
+        remove_segments(trip_key, changes[trip_key][0], payload)
+    for trip_key in deleted:
+        remove_segments(trip_key, None, None)
+    if isinstance(trips, TripMap):
+        for trip_key, payload in written.items():
+            trips.set_baseline(trip_key, payload)
+    _notify(written, deleted, changes)
 
 
 def new_id(prefix: str = "id") -> str:
@@ -105,7 +503,6 @@ def _normalize_message(msg: dict) -> dict:
             "message": str(msg),
             "time": now,
             "created_at": now,
-            "read_by": [],
             "reactions": {},
             "pinned": False,
         }
@@ -138,7 +535,6 @@ def _normalize_message(msg: dict) -> dict:
         "time": timestamp,
         "created_at": msg.get("created_at") or timestamp,
         "updated_at": msg.get("updated_at") or "",
-        "read_by": msg.get("read_by") if isinstance(msg.get("read_by"), list) else [],
         "reactions": normalized_reactions,
         "pinned": bool(msg.get("pinned")),
     }
@@ -215,84 +611,368 @@ def _normalize_expense(exp: dict) -> dict:
     }
 
 
+def message_timestamp(msg: dict) -> str:
+    """Zeitstempel einer Nachricht für Sortierung und Lesemarken."""
+    return str(msg.get("created_at") or msg.get("time") or "")
+
+
+def _migrate_read_by(trip: dict) -> None:
+    """Überführt ``read_by``-Listen (Schema 1) in Lesemarken pro Person.
+
+    Die Marke ist der Zeitstempel der neuesten Nachricht, die jemand gelesen
+    hat; ältere Nachrichten gelten damit ebenfalls als gelesen.
+    """
+    last_read = trip.setdefault("last_read", {})
+    for msg in trip_messages(trip):
+        if not isinstance(msg, dict) or not isinstance(msg.get("read_by"), list):
+            continue
+        timestamp = message_timestamp(msg)
+        for reader in msg["read_by"]:
+            marks = last_read.setdefault(str(reader), {})
+            if isinstance(marks, dict) and timestamp > str(marks.get("chat") or ""):
+                marks["chat"] = timestamp
+
+
+def normalize_trip(trip_key: str, trip: dict, force: bool = False) -> dict:
+    if not isinstance(trip, dict):
+        trip = {"name": str(trip_key)}
+    elif not force and trip.get("schema_version") == SCHEMA_VERSION:
+        return trip
+
+    trip.setdefault("name", trip_key)
+    trip.setdefault("participants", {})
+    trip.setdefault("images", [])
+    trip.setdefault("details", {})
+    trip.setdefault("last_read", {})
+
+    _migrate_read_by(trip)
+    trip["messages"] = [_normalize_message(msg) for msg in trip_messages(trip)]
+    trip.pop(LEGACY_CHAT_FIELD, None)
+
+    tasks = trip.get("tasks") if isinstance(trip.get("tasks"), list) else []
+    trip["tasks"] = [_normalize_task(task) for task in tasks]
+
+    expenses = trip.get("expenses") if isinstance(trip.get("expenses"), list) else []
+    trip["expenses"] = [_normalize_expense(exp) for exp in expenses]
+
+    details = trip["details"]
+    details.setdefault("destination", "")
+    details.setdefault("city", "")
+    details.setdefault("street", "")
+    details.setdefault("postal_code", "")
+    details.setdefault("homepage", "")
+    details.setdefault("extra", "")
+    details.setdefault("start_date", str(datetime.date.today()))
+    details.setdefault("end_date", str(datetime.date.today()))
+    details.setdefault("meet_date", str(datetime.date.today()))
+    details.setdefault("meet_time", "18:00")
+
+    participants = trip["participants"]
+    for participant_key, meta in list(participants.items()):
+        if not isinstance(meta, dict):
+            participants[participant_key] = {
+                "display_name": str(participant_key),
+                "role": "member",
+            }
+            meta = participants[participant_key]
+        meta.setdefault("display_name", str(participant_key))
+        if meta.get("role") not in {"admin", "editor", "member", "viewer"}:
+            meta["role"] = "member"
+
+    rebuild_unread(trip)
+    trip["schema_version"] = SCHEMA_VERSION
+    return trip
+
+
 def normalize_data(data: dict) -> dict:
     if not isinstance(data, dict):
         data = {}
     trips = data.setdefault("trips", {})
-    for trip_key, trip in trips.items():
-        if not isinstance(trip, dict):
-            trips[trip_key] = {"name": str(trip_key)}
-            trip = trips[trip_key]
-
-        trip.setdefault("name", trip_key)
-        trip.setdefault("participants", {})
-        trip.setdefault("images", [])
-        trip.setdefault("details", {})
-        trip.setdefault("last_read", {})
-
-        legacy_chat = trip.get("chat") if isinstance(trip.get("chat"), list) else []
-        current_messages = trip.get("messages") if isinstance(trip.get("messages"), list) else []
-        source_messages = current_messages or legacy_chat
-        normalized_messages = [_normalize_message(msg) for msg in source_messages]
-        trip["messages"] = normalized_messages
-        trip["chat"] = deepcopy(normalized_messages)
-
-        tasks = trip.get("tasks") if isinstance(trip.get("tasks"), list) else []
-        trip["tasks"] = [_normalize_task(task) for task in tasks]
-
-        expenses = trip.get("expenses") if isinstance(trip.get("expenses"), list) else []
-        trip["expenses"] = [_normalize_expense(exp) for exp in expenses]
-
-        details = trip["details"]
-        details.setdefault("destination", "")
-        details.setdefault("city", "")
-        details.setdefault("street", "")
-        details.setdefault("postal_code", "")
-        details.setdefault("homepage", "")
-        details.setdefault("extra", "")
-        details.setdefault("start_date", str(datetime.date.today()))
-        details.setdefault("end_date", str(datetime.date.today()))
-        details.setdefault("meet_date", str(datetime.date.today()))
-        details.setdefault("meet_time", "18:00")
-
-        participants = trip["participants"]
-        for participant_key, meta in list(participants.items()):
-            if not isinstance(meta, dict):
-                participants[participant_key] = {
-                    "display_name": str(participant_key),
-                    "role": "member",
-                }
-                meta = participants[participant_key]
-            meta.setdefault("display_name", str(participant_key))
-            if meta.get("role") not in {"admin", "editor", "member", "viewer"}:
-                meta["role"] = "member"
-
+    if isinstance(trips, TripMap):
+        # Reisen aus load_db werden bereits normalisiert im Cache abgelegt.
+        return data
+    for trip_key, trip in list(trips.items()):
+        trips[trip_key] = normalize_trip(trip_key, trip)
     return data
 
 
-def mark_read(trip: dict, user: str, area: str) -> None:
-    lr = trip.setdefault("last_read", {})
-    user_lr = lr.setdefault(user, {})
-    user_lr[area] = datetime.datetime.now().replace(microsecond=0).isoformat()
+def migrate_db(force: bool = False) -> list[str]:
+    """Normalisiert alle Reisen ohne aktuellen Schema-Stempel und speichert sie.
+
+    Gibt die Schlüssel der neu geschriebenen Reisen zurück.
+    """
+    store = _get_store()
+    index = store.load_index()
+    changes = {}
+    for trip_key in index["trips"]:
+        raw = store.load_trip(trip_key, index)
+        if raw is None:
+            continue
+        if not force and raw.get("schema_version") == SCHEMA_VERSION and LEGACY_CHAT_FIELD not in raw:
+            continue
+        trip = normalize_trip(trip_key, deepcopy(raw), force=force)
+        changes[trip_key] = (raw, _prepare_trip_for_save(trip_key, trip))
+    meta = {**index["meta"], "format_version": FORMAT_VERSION, "schema_version": SCHEMA_VERSION}
+    if changes or meta != index["meta"]:
+        written = store.commit(changes, set(), meta)
+        _invalidate_cache(set(changes))
+        _notify(written, set(), changes)
+    return list(changes)
+
+
+def archive_db(max_age_days: int = ARCHIVE_AFTER_DAYS, keep: int = ARCHIVE_KEEP) -> dict[str, int]:
+    """Archiviert alte Chat-Nachrichten aller Reisen (siehe core.archive).
+
+    Gibt pro geänderter Reise die Anzahl der archivierten Nachrichten zurück.
+    """
+    store = _get_store()
+    index = store.load_index()
+    changes = {}
+    moved = {}
+    for trip_key in index["trips"]:
+        raw = store.load_trip(trip_key, index)
+        if raw is None:
+            continue
+        trip = normalize_trip(trip_key, deepcopy(raw))
+        count = archive_trip(trip_key, trip, max_age_days, keep)
+        if count:
+            changes[trip_key] = (raw, _prepare_trip_for_save(trip_key, trip, raw))
+            moved[trip_key] = count
+    if changes:
+        written = store.commit(changes, set(), None)
+        _invalidate_cache(set(changes))
+        _notify(written, set(), changes)
+    return moved
+
+
+def migrate_blobs_db(collect: bool = False) -> tuple[dict[str, int], list[str]]:
+    """Verschiebt base64-Fotos aller Reisen in den Blob-Speicher.
+
+    Fehlende Vorschaufassungen werden dabei ergänzt, die Referenzzähler
+    danach aus allen Reisen neu ausgezählt. Mit ``collect`` werden unbenutzte
+    Dateien gelöscht. Gibt die Anzahl der verschobenen Fotos pro Reise und
+    die gelöschten Hashes zurück.
+    """
+    store = _get_store()
+    index = store.load_index()
+    changes = {}
+    moved = {}
+    counts: Counter = Counter()
+    for trip_key in index["trips"]:
+        raw = store.load_trip(trip_key, index)
+        if raw is None:
+            continue
+        images = deepcopy(raw.get("images"))
+        if not isinstance(images, list):
+            continue
+        count = extract_images(images)
+        if add_thumbnails(images) or count:
+            changes[trip_key] = (raw, {**raw, "images": images})
+        if count:
+            moved[trip_key] = count
+        counts.update(image_refs(images))
+    if changes:
+        written = store.commit(changes, set(), None)
+        _invalidate_cache(set(changes))
+        _notify(written, set(), changes)
+    blobs = blob_store()
+    blobs.rebuild(dict(counts))
+    removed = blobs.collect(set(counts)) if collect else []
+    return moved, removed
+
+
+def backup_db(compression: str = "gzip") -> str:
+    """Schreibt den kompletten Bestand als Snapshot (Standard: gzip) nach BACKUP_FOLDER.
+
+    Die Datei kann direkt als ``DB_FILE`` verwendet werden; Format und
+    Kompression werden beim Laden erkannt.
+    """
+    store = _get_store()
+    index = store.load_index()
+    doc = {**index["meta"], "trips": {key: store.load_trip(key, index) for key in index["trips"]}}
+    name = os.path.splitext(os.path.basename(DB_FILE))[0] or "reisen_daten"
+    return write_backup(BACKUP_FOLDER, name, doc, MAX_BACKUPS, compression)
+
+
+def rebuild_unread_db(check_only: bool = False) -> list[str]:
+    """Prüft die Ungelesen-Zähler aller Reisen und zählt abweichende neu aus.
+
+    Gibt die Schlüssel der Reisen mit abweichenden Zählern zurück.
+    """
+    store = _get_store()
+    index = store.load_index()
+    changes = {}
+    for trip_key in index["trips"]:
+        raw = store.load_trip(trip_key, index)
+        if raw is None or (raw.get("schema_version") == SCHEMA_VERSION and verify_unread(raw)):
+            continue
+        trip = normalize_trip(trip_key, deepcopy(raw))
+        rebuild_unread(trip)
+        changes[trip_key] = (raw, trip)
+    if changes and not check_only:
+        written = store.commit(changes, set(), None)
+        _invalidate_cache(set(changes))
+        _notify(written, set(), changes)
+    return list(changes)
+
+
+def _set_read_mark(trip: dict, user: str, area: str, newest: str) -> bool:
+    # Die Marke ist der Zeitstempel des neuesten Eintrags, den die Sitzung
+    # kennt, nicht die aktuelle Uhrzeit: was eine andere Sitzung danach
+    # speichert, bleibt ungelesen, auch innerhalb derselben Minute.
+    marks = trip.setdefault("last_read", {}).setdefault(user, {})
+    if not newest or newest <= str(marks.get(area) or ""):
+        return False
+    marks[area] = newest
+    counters = trip.get("unread")
+    if isinstance(counters, dict):
+        counters.setdefault(user, {})[area] = 0
+    return True
+
+
+def mark_read(trip: dict, user: str, area: str) -> bool:
+    """Hebt die Lesemarke eines Bereichs auf dessen neuesten Eintrag."""
+    field, event = UNREAD_AREAS[area]
+    newest = max((event(item)[0] for item in trip.get(field) or [] if isinstance(item, dict)), default="")
+    return _set_read_mark(trip, user, area, newest)
+
+
+def mark_chat_read(trip: dict, user: str) -> bool:
+    """Hebt die Chat-Lesemarke auf die neueste Nachricht, falls nötig.
+
+    Prüft nur die letzte Nachricht und gibt zurück, ob sich etwas geändert hat,
+    damit das bloße Öffnen des Chats nichts speichert.
+    """
+    messages = trip.get("messages") or []
+    if not messages or not isinstance(messages[-1], dict):
+        return False
+    return _set_read_mark(trip, user, "chat", message_timestamp(messages[-1]))
+
+
+def chat_read_marks(trip: dict) -> tuple[list[str], list[str]]:
+    """Chat-Lesemarken aller Personen, aufsteigend sortiert: (Marken, Personen)."""
+    pairs = sorted(
+        (str(areas["chat"]), str(person))
+        for person, areas in (trip.get("last_read") or {}).items()
+        if isinstance(areas, dict) and areas.get("chat")
+    )
+    return [mark for mark, _ in pairs], [person for _, person in pairs]
 
 
-def get_chat_unread_count(trip: dict, user: str) -> int:
-    last = trip.get("last_read", {}).get(user, {}).get("chat", "")
-    return sum(
-        1
-        for msg in trip.get("messages", [])
-        if isinstance(msg, dict)
-        and (msg.get("user") or msg.get("author")) != user
-        and (msg.get("time") or msg.get("created_at") or "") > last
+def readers_of(marks: tuple[list[str], list[str]], msg: dict) -> list[str]:
+    """Personen, deren Lesemarke mindestens beim Zeitstempel der Nachricht liegt."""
+    timestamps, people = marks
+    return people[bisect.bisect_left(timestamps, message_timestamp(msg)):]
+
+
+def _chat_event(msg: dict) -> tuple[str, str]:
+    return message_timestamp(msg), str(msg.get("user") or msg.get("author") or "")
+
+
+def _task_event(task: dict) -> tuple[str, str]:
+    return str(task.get("updated_at") or task.get("created_at") or ""), str(task.get("updated_by") or task.get("created_by") or "")
+
+
+# Bereich → (Liste der Reise, Zeitpunkt und Person der letzten Änderung eines Eintrags)
+UNREAD_AREAS = {"chat": ("messages", _chat_event), "checklist": ("tasks", _task_event)}
+
+
+def _read_mark(trip: dict, user: str, area: str) -> str:
+    marks = (trip.get("last_read") or {}).get(user)
+    return str(marks.get(area) or "") if isinstance(marks, dict) else ""
+
+
+def _is_unread(item, event, user: str, mark: str) -> bool:
+    if not isinstance(item, dict):
+        return False
+    timestamp, actor = event(item)
+    return actor != user and timestamp > mark
+
+
+def _count_unread(trip: dict, user: str, area: str) -> int:
+    field, event = UNREAD_AREAS[area]
+    mark = _read_mark(trip, user, area)
+    return sum(1 for item in trip.get(field) or [] if _is_unread(item, event, user, mark))
+
+
+def _unread_users(trip: dict) -> set[str]:
+    return {str(user) for user in (trip.get("participants") or {})} | {str(user) for user in (trip.get("last_read") or {})}
+
+
+def rebuild_unread(trip: dict) -> dict:
+    """Zählt die Ungelesen-Zähler aller Personen einer Reise neu aus."""
+    trip["unread"] = {
+        user: {area: _count_unread(trip, user, area) for area in UNREAD_AREAS}
+        for user in sorted(_unread_users(trip))
+    }
+    return trip["unread"]
+
+
+# Nach einem Merge passen die eigenen Zähler nicht mehr zum Ergebnis.
+MERGE_HOOKS.append(rebuild_unread)
+
+
+def verify_unread(trip: dict) -> bool:
+    """Prüft, ob die gespeicherten Zähler dem Neuauszählen entsprechen."""
+    stored = trip.get("unread") or {}
+    return all(
+        isinstance(stored.get(user), dict) and stored[user].get(area) == _count_unread(trip, user, area)
+        for user in _unread_users(trip)
+        for area in UNREAD_AREAS
     )
 
 
+def _update_unread(baseline: dict | None, trip: dict) -> None:
+    """Führt ``trip["unread"]`` beim Speichern anhand der geänderten Einträge nach.
+
+    Pro Person und Bereich wird nur die Differenz der neuen, geänderten oder
+    gelöschten Einträge verrechnet. Neu ausgezählt wird nur, wenn es noch
+    keinen Zähler gibt oder sich die Lesemarke geändert hat. Hat inzwischen
+    eine andere Sitzung gespeichert, zählt der Merge ohnehin neu aus.
+    """
+    if (
+        baseline is None
+        or baseline.get("schema_version") != SCHEMA_VERSION
+        or not isinstance(baseline.get("unread"), dict)
+        or not isinstance(trip.get("unread"), dict)
+    ):
+        # Gespeicherter Stand ohne gültige Zähler, z. B. vor der Migration.
+        rebuild_unread(trip)
+        return
+    counters = trip["unread"]
+    users = _unread_users(trip)
+    for user in [user for user in counters if user not in users]:
+        del counters[user]
+    for area, (field, event) in UNREAD_AREAS.items():
+        before = {item.get("id"): item for item in baseline.get(field) or [] if isinstance(item, dict)}
+        after = {item.get("id"): item for item in trip.get(field) or [] if isinstance(item, dict)}
+        changed = [
+            (before.get(item_id), after.get(item_id))
+            for item_id in before.keys() | after.keys()
+            if before.get(item_id) != after.get(item_id)
+        ]
+        for user in users:
+            user_counters = counters.setdefault(user, {})
+            mark = _read_mark(trip, user, area)
+            if area not in user_counters or mark != _read_mark(baseline, user, area):
+                user_counters[area] = _count_unread(trip, user, area)
+                continue
+            user_counters[area] += sum(
+                _is_unread(new, event, user, mark) - _is_unread(old, event, user, mark)
+                for old, new in changed
+            )
+
+
+def _unread_count(trip: dict, user: str, area: str) -> int:
+    counters = (trip.get("unread") or {}).get(user)
+    if isinstance(counters, dict) and isinstance(counters.get(area), int):
+        return max(0, counters[area])
+    return _count_unread(trip, user, area)
+
+
+def get_chat_unread_count(trip: dict, user: str) -> int:
+    return _unread_count(trip, user, "chat")
+
+
 def get_checklist_unread_count(trip: dict, user: str) -> int:
-    last = trip.get("last_read", {}).get(user, {}).get("checklist", "")
-    unread = 0
-    for task in trip.get("tasks", []):
-        event_time = task.get("updated_at") or task.get("created_at") or ""
-        event_user = task.get("updated_by") or task.get("created_by") or ""
-        if event_user != user and event_time > last:
-            unread += 1
-    return unread
+    return _unread_count(trip, user, "checklist")
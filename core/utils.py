@@ -1,9 +1,9 @@
 import qrcode
 from io import BytesIO
-from PIL import Image
-import base64
 import datetime
 
+from core.images import open_image
+
 # -------------------------------------------------
 # QR-Code für App-Link erzeugen
 # -------------------------------------------------
@@ -24,8 +24,8 @@ def generate_qr_code(url):
 # -------------------------------------------------
 # WebP Bild komprimieren
 # -------------------------------------------------
-def convert_to_webp(image_bytes, quality=70):
-    img = Image.open(BytesIO(image_bytes))
+def convert_to_webp(image_bytes, quality=70, max_side=None):
+    img = open_image(image_bytes, max_side)
     buf = BytesIO()
     img.save(buf, format="WEBP", quality=quality)
     return buf.getvalue()
@@ -8,6 +8,7 @@ import requests
 import re
 import streamlit as st
 
+from app.live_sync import auto_refresh
 from app.theme import apply_theme
 from core.config import APP_NAME, APP_URL
 from core.storage import (
@@ -15,9 +16,11 @@ from core.storage import (
     get_checklist_unread_count,
     load_db,
     mark_read,
+    new_id,
     normalize_data,
     reset_db,
     save_db,
+    trip_names,
 )
 from ui.ui_chat import render_chat
 from ui.ui_checklist import render_checklist
@@ -545,7 +548,8 @@ if "selected_trip" not in st.session_state or st.session_state.selected_trip not
 
 with st.sidebar:
     st.markdown(f"### 👋 {user}")
-    trip_key = st.selectbox("Reise wählen", trip_keys, key="selected_trip")
+    names = trip_names(data)
+    trip_key = st.selectbox("Reise wählen", trip_keys, key="selected_trip", format_func=lambda key: names.get(key, key))
     _set_query_params(user=user, trip=trip_key, tab=st.session_state.get("top_nav_key", "overview"))
     st.caption("Einladungslink und Teilnehmerverwaltung findest du unter „Infos“.")
     if st.button("Neu laden", use_container_width=True):
@@ -590,6 +594,7 @@ chat_unread = get_chat_unread_count(trip, user)
 check_unread = get_checklist_unread_count(trip, user)
 
 _handle_in_app_notifications(trip_key, chat_unread, check_unread)
+auto_refresh(trip_key, trip)
 
 with st.sidebar:
     if role == "admin":
@@ -622,16 +627,17 @@ nav_items = [
     ("infos", "Infos"),
 ]
 
-def _nav_display_label(key: str, label: str) -> str:
-    trip_details = trip.get("details", {}) or {}
-    photos_count = len(trip.get("images", []) or [])
-    costs_count = len(trip.get("expenses", []) or [])
-    info_has_content = any(
-        str(trip_details.get(field, "")).strip()
-        for field in ["destination", "city", "street", "postal_code", "homepage", "extra"]
-    )
-    overview_has_content = info_has_content or bool(trip.get("weather_cache"))
+trip_details = trip.get("details", {}) or {}
+photos_count = len(trip.get("images", []) or [])
+costs_count = len(trip.get("expenses", []) or [])
+info_has_content = any(
+    str(trip_details.get(field, "")).strip()
+    for field in ["destination", "city", "street", "postal_code", "homepage", "extra"]
+)
+overview_has_content = info_has_content or bool(trip.get("weather_cache"))
 
+
+def _nav_display_label(key: str, label: str) -> str:
     if key == "chat" and chat_unread:
         return f"{label} ({chat_unread})"
     if key == "checklist" and check_unread:
@@ -743,20 +749,20 @@ elif selected == "chat":
         mark_read(trip, user, "chat")
         save_db(data)
         st.session_state.setdefault("notify_cache", {}).setdefault(trip_key, {})["chat"] = 0
-    render_chat(data, trip_key, user)
+    render_chat(trip_key, user)
 
 elif selected == "checklist":
     if check_unread:
         mark_read(trip, user, "checklist")
         save_db(data)
         st.session_state.setdefault("notify_cache", {}).setdefault(trip_key, {})["checklist"] = 0
-    render_checklist(data, trip_key, user)
+    render_checklist(trip_key, user)
 
 elif selected == "costs":
-    render_costs(data, trip_key, user)
+    render_costs(trip_key, user)
 
 elif selected == "photos":
-    render_photos(data, trip_key)
+    render_photos(trip_key)
 
 else:
     render_info(data, trip_key, user, APP_URL)
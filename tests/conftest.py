@@ -0,0 +1,19 @@
+import pytest
+
+from core import archive, blobstore, storage
+
+
+@pytest.fixture(params=["json", "journal", "sharded", "sqlite"])
+def db(request, tmp_path, monkeypatch):
+    """Leerer Datenspeicher im jeweiligen Speicherverfahren unter ``tmp_path``."""
+    mode = request.param
+    db_file = f"sqlite:///{tmp_path}/reisen.db" if mode == "sqlite" else str(tmp_path / "reisen_daten.json")
+    monkeypatch.setattr(storage, "DB_FILE", db_file)
+    monkeypatch.setattr(storage, "STORAGE_MODE", mode)
+    monkeypatch.setattr(storage, "SHARD_DIR", str(tmp_path / "trips"))
+    monkeypatch.setattr(storage, "SQLITE_IMPORT_FILE", str(tmp_path / "import.json"))
+    monkeypatch.setattr(blobstore, "BLOB_DIR", str(tmp_path / "blobs"))
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    storage._get_store()
+    yield mode
+    storage._invalidate_cache()
@@ -0,0 +1,56 @@
+import os
+
+from core import archive, storage
+from core.chat_index import search_archived
+
+
+def _archived_trip(trip_key: str = "reise") -> str:
+    data = storage.load_db()
+    trip = storage.normalize_trip(trip_key, {"name": trip_key})
+    trip["messages"] = [
+        {"id": f"m{i}", "author": "Anna", "user": "Anna", "text": f"Zelt {i}", "created_at": f"2020-01-0{i + 1}T10:00"}
+        for i in range(3)
+    ]
+    data["trips"][trip_key] = trip
+    assert archive.archive_trip(trip_key, trip, max_age_days=30, keep=1) == 3
+    storage.save_db(data)
+    return trip_key
+
+
+def _segment_files(trip_key: str) -> list[str]:
+    directory = archive._trip_dir(trip_key)
+    return os.listdir(directory) if os.path.isdir(directory) else []
+
+
+def test_clearing_chat_removes_segments(db):
+    trip_key = _archived_trip()
+    assert len(_segment_files(trip_key)) == 1
+    data = storage.load_db()
+    trip = data["trips"][trip_key]
+    assert len(search_archived(trip_key, trip, "zelt")) == 3
+
+    trip["messages"] = []
+    trip.pop(archive.ARCHIVE_FIELD, None)
+    storage.save_db(data)
+
+    assert _segment_files(trip_key) == []
+    assert search_archived(trip_key, storage.load_db()["trips"][trip_key], "zelt") == []
+
+
+def test_deleting_trip_removes_archive_dir(db):
+    trip_key = _archived_trip()
+    data = storage.load_db()
+    del data["trips"][trip_key]
+    storage.save_db(data)
+    assert not os.path.exists(archive._trip_dir(trip_key))
+
+
+def test_merge_keeps_segments_still_referenced(db):
+    trip_key = _archived_trip()
+    anna = storage.load_db()
+    ben = storage.load_db()
+    ben["trips"][trip_key]["name"] = "Umbenannt"
+    storage.save_db(ben)
+    anna["trips"][trip_key]["details"] = {"city": "Ulm"}
+    storage.save_db(anna)
+    assert len(_segment_files(trip_key)) == 1
@@ -0,0 +1,24 @@
+from core.chat_index import search_messages
+
+
+def _trip(display_name: str) -> dict:
+    return {
+        "version": 3,
+        "participants": {"anna": {"display_name": display_name}},
+        "messages": [
+            {"id": "m1", "author": "anna", "user": "anna", "text": "Ich bringe das Zelt"},
+            {"id": "m2", "author": "ben", "user": "ben", "text": "Grill ist dabei"},
+        ],
+    }
+
+
+def test_author_search_uses_current_display_name():
+    trip = _trip("Anna")
+    assert [m["id"] for m in search_messages("t1", trip, "anna", {"anna": "Anna"})] == ["m1"]
+
+    # Umbenannt: alte Nachrichten sind unter dem neuen Namen zu finden.
+    trip["participants"]["anna"]["display_name"] = "Annabell Meier"
+    people = {"anna": "Annabell Meier", "Annabell Meier": "Annabell Meier"}
+    assert [m["id"] for m in search_messages("t1", trip, "meier", people)] == ["m1"]
+    assert [m["id"] for m in search_messages("t1", trip, "meier zelt", people)] == ["m1"]
+    assert search_messages("t1", trip, "meier grill", people) == []
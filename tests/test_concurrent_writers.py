@@ -0,0 +1,33 @@
+import multiprocessing
+
+from core import storage
+
+
+def _append_messages(config: dict, trip_key: str, writer: int, count: int) -> None:
+    for name, value in config.items():
+        setattr(storage, name, value)
+    for i in range(count):
+        data = storage.load_db()
+        data["trips"][trip_key]["messages"].append(
+            {"id": f"w{writer}_{i}", "author": f"P{writer}", "user": f"P{writer}", "text": str(i)}
+        )
+        storage.save_db(data)
+
+
+def test_processes_appending_to_same_trip_lose_nothing(db):
+    data = storage.load_db()
+    data["trips"]["reise"] = storage.normalize_trip("reise", {"name": "reise"})
+    storage.save_db(data)
+    config = {name: getattr(storage, name) for name in ("DB_FILE", "STORAGE_MODE", "SHARD_DIR", "SQLITE_IMPORT_FILE")}
+
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_append_messages, args=(config, "reise", writer, 25)) for writer in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(120)
+    assert [worker.exitcode for worker in workers] == [0, 0, 0]
+
+    storage._invalidate_cache()
+    messages = storage.load_db()["trips"]["reise"]["messages"]
+    assert sorted(m["id"] for m in messages) == sorted(f"w{w}_{i}" for w in range(3) for i in range(25))
@@ -0,0 +1,39 @@
+import asyncio
+import json
+
+from app import event_sidecar
+
+
+async def _publish_status(headers: dict) -> tuple[str, int]:
+    """Startet den Dienst mit Token "geheim" und sendet eine Meldung; (Status, zugestellt)."""
+    hub = event_sidecar.EventHub()
+    delivered = hub.subscribe("reise")
+    server = await asyncio.start_server(lambda r, w: event_sidecar._handle(hub, "geheim", r, w), "127.0.0.1", 0)
+    async with server:
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = json.dumps({"trip": "reise", "version": 2}).encode("utf-8")
+        head = "".join(f"{name}: {value}\r\n" for name, value in {**headers, "Content-Length": len(body)}.items())
+        writer.write(f"POST /publish HTTP/1.1\r\nHost: localhost\r\n{head}\r\n".encode("latin-1") + body)
+        await writer.drain()
+        status = (await reader.readline()).decode("latin-1").split(" ", 1)[1].strip()
+        writer.close()
+    return status, delivered.qsize()
+
+
+def test_publish_requires_token():
+    assert asyncio.run(_publish_status({})) == ("403 Forbidden", 0)
+    assert asyncio.run(_publish_status({event_sidecar.TOKEN_HEADER: "falsch"})) == ("403 Forbidden", 0)
+    assert asyncio.run(_publish_status({event_sidecar.TOKEN_HEADER: "geheim"})) == ("200 OK", 1)
+
+
+def test_sidecar_listens_on_loopback_by_default(monkeypatch):
+    started = {}
+
+    async def fake_serve(host, port, token):
+        started.update(host=host, port=port, token=token)
+
+    monkeypatch.setattr(event_sidecar, "EVENTS_TOKEN", "geheim")
+    monkeypatch.setattr(event_sidecar, "serve", fake_serve)
+    event_sidecar.main([])
+    assert started == {"host": "127.0.0.1", "port": 8765, "token": "geheim"}
@@ -0,0 +1,38 @@
+import multiprocessing
+import os
+
+import pytest
+
+from core import fileio
+
+
+@pytest.mark.parametrize("compression, suffix", [("none", ".json"), ("gzip", ".json.gz")])
+def test_backup_suffix_matches_compression(tmp_path, compression, suffix):
+    path = fileio.write_backup(str(tmp_path), "reisen", {"trips": {}}, 5, compression)
+    assert path.endswith(suffix)
+    with open(path, "rb") as f:
+        assert f.read().startswith(fileio.GZIP_MAGIC) == (compression == "gzip")
+    assert fileio.read_data(path) == {"trips": {}}
+
+
+def test_backup_zstd_falls_back_to_gzip_suffix(tmp_path, monkeypatch):
+    monkeypatch.setattr(fileio, "zstandard", None)
+    assert fileio.write_backup(str(tmp_path), "reisen", {}, 5, "zstd").endswith(".json.gz")
+
+
+def _write_many(path: str, writer: int, count: int) -> None:
+    for i in range(count):
+        fileio.write_data_atomic(path, {"writer": writer, "i": i, "pad": "x" * 4096})
+
+
+def test_concurrent_atomic_writes_from_processes(tmp_path):
+    path = str(tmp_path / "reisen_daten.json")
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_write_many, args=(path, writer, 50)) for writer in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert [worker.exitcode for worker in workers] == [0, 0, 0, 0]
+    assert fileio.read_data(path)["i"] == 49
+    assert os.listdir(tmp_path) == ["reisen_daten.json"]
@@ -0,0 +1,71 @@
+import pytest
+
+from core import journal, storage
+
+pytestmark = pytest.mark.parametrize("db", ["journal"], indirect=True)
+
+
+def _add_message(trip_key: str, text: str) -> None:
+    data = storage.load_db()
+    data["trips"][trip_key]["messages"].append({"id": f"m_{text}", "author": "Anna", "user": "Anna", "text": text})
+    storage.save_db(data)
+
+
+def _trip_with_messages(count: int, trip_key: str = "reise") -> str:
+    data = storage.load_db()
+    data["trips"][trip_key] = storage.normalize_trip(trip_key, {"name": trip_key, "participants": {"Anna": {}}})
+    storage.save_db(data)
+    for pos in range(count):
+        _add_message(trip_key, str(pos))
+    return trip_key
+
+
+def _reopen(store: journal.JournalStore) -> journal.JournalStore:
+    """Frische Instanz auf denselben Dateien, wie nach einem Neustart."""
+    return journal.JournalStore(store.snapshot_path, store.journal_path)
+
+
+def _message_ids(store: journal.JournalStore, trip_key: str) -> list[str]:
+    return [msg["id"] for msg in store.load_trip(trip_key)["messages"]]
+
+
+def test_replay_after_crash_between_snapshot_and_journal_trim(db, monkeypatch):
+    trip_key = _trip_with_messages(3)
+    store = storage._get_store()
+
+    def crash(path, raw):
+        raise OSError("Absturz beim Kürzen des Journals")
+
+    # Der Snapshot ist geschrieben, das Journal enthält aber noch alle Zeilen.
+    with monkeypatch.context() as patch, pytest.raises(OSError):
+        patch.setattr(journal, "write_bytes_atomic", crash)
+        store.compact()
+
+    restarted = _reopen(store)
+    assert _message_ids(restarted, trip_key) == ["m_0", "m_1", "m_2"]
+
+    # Weitere Speichervorgänge nach dem Neustart gehen nicht verloren.
+    monkeypatch.setattr(storage, "_store", restarted)
+    storage._invalidate_cache()
+    _add_message(trip_key, "3")
+    assert _message_ids(_reopen(store), trip_key) == ["m_0", "m_1", "m_2", "m_3"]
+
+    restarted.compact()
+    assert _message_ids(_reopen(store), trip_key) == ["m_0", "m_1", "m_2", "m_3"]
+
+
+def test_replay_skips_torn_last_line_and_keeps_later_records(db):
+    trip_key = _trip_with_messages(2)
+    store = storage._get_store()
+    with open(store.journal_path, "rb") as f:
+        last = f.readlines()[-1]
+    with open(store.journal_path, "ab") as f:
+        # Absturz mitten im Schreiben einer Zeile.
+        f.write(last[: len(last) // 2])
+
+    restarted = _reopen(store)
+    assert _message_ids(restarted, trip_key) == ["m_0", "m_1"]
+
+    storage._invalidate_cache()
+    _add_message(trip_key, "2")
+    assert _message_ids(_reopen(store), trip_key) == ["m_0", "m_1", "m_2"]
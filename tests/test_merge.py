@@ -0,0 +1,84 @@
+from core import storage
+
+
+def _trip(trip_key: str = "reise") -> str:
+    data = storage.load_db()
+    trip = storage.normalize_trip(trip_key, {"name": trip_key, "participants": {"Anna": {}, "Ben": {}}})
+    trip["messages"] = [{"id": "m1", "author": "Anna", "user": "Anna", "text": "Hallo", "reactions": {}}]
+    trip["tasks"] = [{"id": "t1", "text": "Zelt", "done": False}]
+    data["trips"][trip_key] = trip
+    storage.save_db(data)
+    return trip_key
+
+
+def test_concurrent_append_and_edit_merge_without_loss(db):
+    trip_key = _trip()
+    anna = storage.load_db()
+    ben = storage.load_db()
+    anna_trip = anna["trips"][trip_key]
+    ben_trip = ben["trips"][trip_key]
+
+    anna_trip["messages"].append({"id": "m2", "author": "Anna", "user": "Anna", "text": "Von Anna"})
+    anna_trip["messages"][0]["reactions"]["👍"] = ["Anna"]
+    ben_trip["messages"].append({"id": "m3", "author": "Ben", "user": "Ben", "text": "Von Ben"})
+    ben_trip["messages"][0]["text"] = "Hallo zusammen"
+    ben_trip["tasks"][0]["done"] = True
+    storage.save_db(ben)
+    storage.save_db(anna)
+
+    final = storage.load_db()["trips"][trip_key]
+    assert [m["id"] for m in final["messages"]] == ["m1", "m3", "m2"]
+    assert final["messages"][0]["text"] == "Hallo zusammen"
+    assert final["messages"][0]["reactions"] == {"👍": ["Anna"]}
+    assert final["tasks"][0]["done"] is True
+    assert final["version"] == 3
+    assert storage.verify_unread(final)
+
+
+def test_merge_keeps_references_held_by_the_ui(db):
+    trip_key = _trip()
+    anna = storage.load_db()
+    anna_trip = anna["trips"][trip_key]
+    messages = anna_trip["messages"]
+    first = messages[0]
+
+    ben = storage.load_db()
+    ben["trips"][trip_key]["messages"].append({"id": "m3", "author": "Ben", "user": "Ben", "text": "Neu"})
+    storage.save_db(ben)
+
+    first["pinned"] = True
+    storage.save_db(anna)
+
+    # Die Liste und die Nachricht, die die UI vor dem Speichern hielt, zeigen den neuen Stand.
+    assert anna_trip["messages"] is messages
+    assert messages[0] is first
+    assert [m["id"] for m in messages] == ["m1", "m3"]
+
+
+def test_deleted_item_stays_deleted_after_merge(db):
+    trip_key = _trip()
+    anna = storage.load_db()
+    ben = storage.load_db()
+    anna["trips"][trip_key]["tasks"] = []
+    ben["trips"][trip_key]["messages"].append({"id": "m3", "author": "Ben", "user": "Ben", "text": "Neu"})
+    storage.save_db(ben)
+    storage.save_db(anna)
+
+    final = storage.load_db()["trips"][trip_key]
+    assert final["tasks"] == []
+    assert [m["id"] for m in final["messages"]] == ["m1", "m3"]
+
+
+def test_merge_hooks_run_on_merged_trip(db, monkeypatch):
+    seen = []
+    monkeypatch.setattr("core.changes.MERGE_HOOKS", [*storage.MERGE_HOOKS, lambda trip: seen.append(len(trip["messages"]))])
+    trip_key = _trip()
+    anna = storage.load_db()
+    ben = storage.load_db()
+    anna_trip = anna["trips"][trip_key]
+    ben["trips"][trip_key]["messages"].append({"id": "m3", "author": "Ben", "user": "Ben", "text": "Neu"})
+    storage.save_db(ben)
+    assert seen == []
+    anna_trip["messages"].append({"id": "m2", "author": "Anna", "user": "Anna", "text": "Auch"})
+    storage.save_db(anna)
+    assert seen == [3]
@@ -0,0 +1,72 @@
+import pytest
+
+from core import storage
+from core.sqlite_store import SqliteStore
+
+pytestmark = pytest.mark.parametrize("db", ["sqlite"], indirect=True)
+
+
+def _trip(trip_key: str) -> str:
+    data = storage.load_db()
+    trip = storage.normalize_trip(trip_key, {"name": trip_key, "participants": {"Anna": {}, "Ben": {}}})
+    trip["messages"] = [{"id": f"m{pos}", "author": "Anna", "user": "Anna", "text": str(pos)} for pos in range(3)]
+    trip["tasks"] = [{"id": f"t{pos}", "text": f"Aufgabe {pos}", "done": False} for pos in range(3)]
+    data["trips"][trip_key] = trip
+    storage.save_db(data)
+    return trip_key
+
+
+def _rowids(store: SqliteStore, table: str, trip_key: str) -> dict[str, int]:
+    rows = store._conn().execute(f"SELECT id, rowid FROM {table} WHERE trip_id = ?", (trip_key,))
+    return dict(rows.fetchall())
+
+
+def test_single_task_update_writes_only_its_row(db):
+    trip_key = _trip("reise")
+    store = storage._get_store()
+    tasks_before = _rowids(store, "tasks", trip_key)
+    messages_before = _rowids(store, "messages", trip_key)
+
+    data = storage.load_db()
+    data["trips"][trip_key]["tasks"][1]["done"] = True
+    statements = []
+    store._conn().set_trace_callback(statements.append)
+    try:
+        storage.save_db(data)
+    finally:
+        store._conn().set_trace_callback(None)
+
+    task_writes = [sql for sql in statements if "tasks" in sql and not sql.lstrip().upper().startswith("SELECT")]
+    assert len(task_writes) == 1 and "'t1'" in task_writes[0]
+    assert not [sql for sql in statements if sql.lstrip().upper().startswith("DELETE")]
+    assert _rowids(store, "tasks", trip_key) == tasks_before
+    assert _rowids(store, "messages", trip_key) == messages_before
+    assert [task["done"] for task in store.load_trip(trip_key)["tasks"]] == [False, True, False]
+
+
+def test_revisions_show_changes_from_another_connection(db):
+    trip_key = _trip("reise")
+    other_key = _trip("andere")
+    store = storage._get_store()
+    # Eigene Verbindung, wie ein zweiter App-Prozess auf derselben Datei.
+    other = SqliteStore(store.path)
+    index_token = other.index_token()
+    trip_token = other.trip_token(trip_key)
+    other_token = other.trip_token(other_key)
+
+    data = storage.load_db()
+    data["trips"][trip_key]["tasks"][0]["done"] = True
+    storage.save_db(data)
+
+    assert other.index_token() != index_token
+    assert other.trip_token(trip_key) != trip_token
+    assert other.trip_token(other_key) == other_token
+    assert other.load_trip(trip_key)["tasks"][0]["done"] is True
+
+    # Ein veralteter Stand wird auf die neue Revision übertragen, nicht darübergeschrieben.
+    stale = storage.load_db()["trips"][trip_key]
+    baseline = dict(stale, version=stale["version"] - 1, tasks=[dict(task, done=False) for task in stale["tasks"]])
+    payload = dict(baseline, tasks=[*baseline["tasks"], {"id": "t9", "text": "Neu", "done": False}])
+    written = other.commit({trip_key: (baseline, payload)}, set())
+    assert written[trip_key]["tasks"][0]["done"] is True
+    assert [task["id"] for task in store.load_trip(trip_key)["tasks"]] == ["t0", "t1", "t2", "t9"]
@@ -0,0 +1,101 @@
+import datetime
+
+from core import storage
+
+
+def _message(author: str, text: str) -> dict:
+    return {
+        "id": storage.new_id("msg"),
+        "author": author,
+        "user": author,
+        "text": text,
+        "created_at": datetime.datetime.now().isoformat(timespec="microseconds"),
+        "reactions": {},
+        "pinned": False,
+    }
+
+
+def _create_trip(trip_key: str = "reise") -> str:
+    data = storage.load_db()
+    data["trips"][trip_key] = storage.normalize_trip(
+        trip_key, {"name": trip_key, "participants": {"Anna": {}, "Ben": {}}}
+    )
+    data["trips"][trip_key]["messages"].append(_message("Ben", "Hallo"))
+    storage.save_db(data)
+    return trip_key
+
+
+def test_concurrent_mark_read_and_new_message(db):
+    trip_key = _create_trip()
+    anna = storage.load_db()
+    anna_trip = anna["trips"][trip_key]
+    assert storage.get_chat_unread_count(anna_trip, "Anna") == 1
+
+    ben = storage.load_db()
+    ben["trips"][trip_key]["messages"].append(_message("Ben", "Noch da?"))
+    storage.save_db(ben)
+
+    # Anna hat Bens zweite Nachricht noch nicht gesehen.
+    assert storage.mark_chat_read(anna_trip, "Anna")
+    storage.save_db(anna)
+
+    final = storage.load_db()["trips"][trip_key]
+    assert [m["text"] for m in final["messages"]] == ["Hallo", "Noch da?"]
+    assert storage.verify_unread(final)
+    assert storage.get_chat_unread_count(final, "Anna") == 1
+    assert storage.get_chat_unread_count(final, "Ben") == 0
+    # Die Sitzung sieht nach dem Speichern den zusammengeführten Stand.
+    assert anna_trip["unread"] == final["unread"]
+
+
+def test_concurrent_new_messages_keep_counts(db):
+    trip_key = _create_trip()
+    anna = storage.load_db()
+    ben = storage.load_db()
+    anna["trips"][trip_key]["messages"].append(_message("Anna", "Ich auch"))
+    ben["trips"][trip_key]["messages"].append(_message("Ben", "Wer kommt?"))
+    storage.save_db(ben)
+    storage.save_db(anna)
+
+    final = storage.load_db()["trips"][trip_key]
+    assert storage.verify_unread(final)
+    assert storage.get_chat_unread_count(final, "Anna") == 2
+    assert storage.get_chat_unread_count(final, "Ben") == 1
+
+
+def test_message_later_in_same_minute_stays_unread(db):
+    trip_key = _create_trip()
+    anna = storage.load_db()
+    anna_trip = anna["trips"][trip_key]
+    assert storage.mark_chat_read(anna_trip, "Anna")
+    storage.save_db(anna)
+
+    ben = storage.load_db()
+    late = _message("Ben", "Noch was")
+    # Gleiche Minute wie die gelesene Nachricht, aber später.
+    late["created_at"] = anna_trip["messages"][-1]["created_at"][:16] + ":59.999999"
+    ben["trips"][trip_key]["messages"].append(late)
+    storage.save_db(ben)
+
+    final = storage.load_db()["trips"][trip_key]
+    assert storage.get_chat_unread_count(final, "Anna") == 1
+    marks = storage.chat_read_marks(final)
+    assert "Anna" not in storage.readers_of(marks, final["messages"][-1])
+    assert "Anna" in storage.readers_of(marks, final["messages"][0])
+
+
+def test_read_mark_uses_created_at_before_time(db):
+    trip_key = _create_trip()
+    data = storage.load_db()
+    trip = data["trips"][trip_key]
+    # Ältere Daten: "time" nur minutengenau, "created_at" genauer.
+    legacy = _message("Ben", "Alt")
+    legacy["time"] = legacy["created_at"][:16]
+    trip["messages"].append(legacy)
+    storage.save_db(data)
+
+    trip = storage.load_db()["trips"][trip_key]
+    assert storage.message_timestamp(trip["messages"][-1]) == legacy["created_at"]
+    assert storage.mark_chat_read(trip, "Anna")
+    assert trip["last_read"]["Anna"]["chat"] == legacy["created_at"]
+    assert "Anna" in storage.readers_of(storage.chat_read_marks(trip), trip["messages"][-1])
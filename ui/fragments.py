@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from core.changes import trip_version
+from core.storage import load_db
+
+
+def rerun_panel() -> None:
+    """Führt nach einer Änderung nur das aktuelle Panel-Fragment neu aus.
+
+    Die Reiter (Chat, Checkliste, Kosten, Fotos) sind ``st.fragment``-Funktionen.
+    Bei einer Interaktion im Panel läuft nur das Fragment, also auch nur dieses
+    neu. Läuft gerade die ganze App (erster Aufruf, Test), wird sie neu gestartet.
+    """
+    ctx = get_script_run_ctx()
+    if ctx is not None and ctx.fragment_ids_this_run:
+        st.rerun(scope="fragment")
+    st.rerun()
+
+
+def load_panel(trip_key: str) -> tuple[dict, dict | None]:
+    """Lädt Daten und Reise für ein Panel-Fragment: (Daten, Reise oder None).
+
+    Fragmente bekommen nur Schlüssel. Läuft ein Fragment allein neu, gibt es
+    keinen frischen Stand aus dem letzten vollständigen Lauf; deshalb lädt es
+    bei jedem Lauf selbst. Das liest nur den Cache, solange sich nichts
+    geändert hat. Die angezeigte ``version`` merkt sich :func:`shown_version`.
+    """
+    data = load_db()
+    trips = data["trips"]
+    if trip_key not in trips:
+        return data, None
+    trip = trips[trip_key]
+    st.session_state.setdefault("panel_versions", {})[trip_key] = trip_version(trip)
+    return data, trip
+
+
+def shown_version(trip_key: str) -> int:
+    """Version der Reise, die ein Panel-Fragment zuletzt angezeigt hat (0 = keine)."""
+    return st.session_state.get("panel_versions", {}).get(trip_key, 0)
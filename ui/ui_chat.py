@@ -1,47 +1,58 @@
 from __future__ import annotations
 
 import datetime
+import functools
 import html
 import streamlit as st
 
-from core.storage import new_id, save_db
+from core.archive import archive_trip, archived_count, load_archived
+from core.chat_index import message_author, search_archived, search_messages
+from core.storage import chat_read_marks, mark_chat_read, message_timestamp, new_id, readers_of, save_db
+from ui.fragments import load_panel, rerun_panel
 
 REACTIONS = ["👍", "❤️", "😂", "🎉", "😮", "😢", "🙏"]
+# Anzahl der zuletzt geschriebenen Nachrichten, die auf einmal gezeigt werden.
+CHAT_WINDOW = 50
+# Anzahl zwischengespeicherter Nachrichtenkarten (prozessweit).
+CARD_CACHE_SIZE = 2000
 
 
-def _raw_message_author(msg: dict) -> str:
-    return str(msg.get("author") or msg.get("user") or msg.get("created_by") or msg.get("display_name") or "Unbekannt")
+def _participant_index(participants: dict) -> dict[str, str]:
+    """Bildet jeden bekannten Namen eines Teilnehmers auf seinen Anzeigenamen ab.
 
-
-def _display_author(msg: dict, participants: dict) -> str:
-    raw_author = _raw_message_author(msg)
-    participant = participants.get(raw_author)
-    if isinstance(participant, dict):
-        display_name = str(participant.get("display_name") or "").strip()
-        if display_name:
-            return display_name
+    Einmal pro Lauf aufgebaut, damit Autoren und Lesebestätigungen ohne
+    Schleife über alle Teilnehmer aufgelöst werden. Teilnehmer-IDs haben
+    Vorrang, sonst gewinnt der erste Teilnehmer mit passendem Alias.
+    """
+    index: dict[str, str] = {}
+    named = []
     for participant_id, participant_data in participants.items():
         if not isinstance(participant_data, dict):
             continue
         display_name = str(participant_data.get("display_name") or "").strip()
-        aliases = {
+        if display_name:
+            index[str(participant_id)] = display_name
+            named.append((participant_id, participant_data, display_name))
+    for participant_id, participant_data, display_name in named:
+        for alias in (
             str(participant_id).strip(),
             str(participant_data.get("name") or "").strip(),
             str(participant_data.get("user") or "").strip(),
             str(participant_data.get("username") or "").strip(),
             display_name,
-        }
-        if raw_author in aliases and display_name:
-            return display_name
-    return raw_author
+        ):
+            if alias:
+                index.setdefault(alias, display_name)
+    return index
 
 
-def _message_text(msg: dict) -> str:
-    return str(msg.get("text") or "")
+def _display_author(msg: dict, people: dict[str, str]) -> str:
+    raw_author = message_author(msg)
+    return people.get(raw_author, raw_author)
 
 
-def _message_timestamp(msg: dict) -> str:
-    return msg.get("created_at") or msg.get("time") or ""
+def _message_text(msg: dict) -> str:
+    return str(msg.get("text") or "")
 
 
 def _format_ts(raw: str) -> str:
@@ -54,16 +65,6 @@ def _format_ts(raw: str) -> str:
         return raw
 
 
-def _mark_messages_as_seen(trip: dict, user: str) -> bool:
-    changed = False
-    for msg in trip.get("messages", []):
-        seen = msg.setdefault("read_by", [])
-        if user not in seen:
-            seen.append(user)
-            changed = True
-    return changed
-
-
 def _toggle_reaction(message: dict, emoji: str, user: str) -> None:
     reactions = message.setdefault("reactions", {})
     users = reactions.setdefault(emoji, [])
@@ -75,17 +76,68 @@ def _toggle_reaction(message: dict, emoji: str, user: str) -> None:
         reactions.pop(emoji, None)
 
 
-def _reaction_summary_html(message: dict, user: str) -> str:
+def _reaction_key(message: dict) -> tuple:
     reactions = message.get("reactions", {}) or {}
+    return tuple((emoji, tuple(reactions[emoji])) for emoji in REACTIONS if reactions.get(emoji))
+
+
+def _reaction_summary_html(reactions: tuple, user: str) -> str:
     pills = []
-    for emoji in REACTIONS:
-        users = reactions.get(emoji, [])
-        if users:
-            active = " me-active" if user in users else ""
-            pills.append(f"<span class='me-reaction-pill{active}'>{emoji} <strong>{len(users)}</strong></span>")
+    for emoji, users in reactions:
+        active = " me-active" if user in users else ""
+        pills.append(f"<span class='me-reaction-pill{active}'>{emoji} <strong>{len(users)}</strong></span>")
     return "<div class='me-reactions'>" + "".join(pills) + "</div>" if pills else ""
 
 
+@functools.lru_cache(maxsize=CARD_CACHE_SIZE)
+def _card_html(
+    msg_id: str,
+    updated_at: str,
+    text: str,
+    timestamp: str,
+    author_display: str,
+    pinned: bool,
+    is_mine: bool,
+    reactions: tuple,
+    viewer: str,
+    seen_names: tuple,
+) -> str:
+    """HTML einer Nachrichtenkarte.
+
+    Prozessweit über alle Sitzungen zwischengespeichert. Alles, was die Karte
+    verändert (Text, Bearbeitung, Reaktionen, Gelesen-Status, Betrachter), ist
+    Teil des Schlüssels, daher ist keine explizite Invalidierung nötig.
+    """
+    safe_author = html.escape(author_display)
+    safe_text = html.escape(text).replace("\n", "<br>")
+    pin_marker = "📌 " if pinned else ""
+    avatar = html.escape(_avatar_text(author_display))
+    mine_class = " mine" if is_mine else ""
+
+    seen_html = ""
+    if seen_names:
+        seen_html = f"<div class='ma-chat-seen'>Gelesen von: {html.escape(', '.join(seen_names[:6]))}</div>"
+
+    return (
+        f"<div class='ma-chat-card{mine_class}'>"
+        "<div class='ma-chat-head'>"
+        "<div class='ma-chat-person'>"
+        f"<div class='ma-chat-avatar'>{avatar}</div>"
+        "<div class='ma-chat-namewrap'>"
+        f"<div class='ma-chat-name'>{pin_marker}{safe_author}</div>"
+        f"<div class='ma-chat-sub'>{_format_ts(timestamp)}</div>"
+        "</div>"
+        "</div>"
+        "</div>"
+        f"<div class='ma-chat-text'>{safe_text}</div>"
+        f"{_reaction_summary_html(reactions, viewer)}"
+        "<div class='ma-chat-meta'>"
+        f"{seen_html or '<div></div>'}"
+        "</div>"
+        "</div>"
+    )
+
+
 def _chat_styles() -> None:
     st.markdown(
         """
@@ -249,24 +301,130 @@ def _avatar_text(name: str) -> str:
     return cleaned[:2].upper()
 
 
-def render_chat(data: dict, trip_key: str, user: str) -> None:
-    trips = data.setdefault("trips", {})
-    trip = trips.setdefault(trip_key, {})
+def _latest_messages(messages: list, window: int) -> tuple[list, bool]:
+    """Die neuesten ``window`` nicht angepinnten Nachrichten, älteste zuerst.
+
+    Nachrichten werden in zeitlicher Reihenfolge angehängt; gesucht wird daher
+    vom Ende her und abgebrochen, sobald das Fenster voll ist. Der zweite Wert
+    gibt an, ob es ältere Nachrichten gibt.
+    """
+    latest = []
+    for msg in reversed(messages):
+        if msg.get("pinned"):
+            continue
+        if len(latest) == window:
+            return sorted(reversed(latest), key=message_timestamp), True
+        latest.append(msg)
+    return sorted(reversed(latest), key=message_timestamp), False
+
+
+def _render_message(
+    data: dict,
+    trip: dict,
+    trip_key: str,
+    msg: dict,
+    fallback_id: str,
+    user: str,
+    role: str,
+    people: dict[str, str],
+    read_marks: tuple[list[str], list[str]],
+    archived: bool = False,
+) -> None:
+    msg_id = msg.get("id") or fallback_id
+    author_raw = message_author(msg)
+    author_display = _display_author(msg, people)
+    can_delete = role == "admin" or author_raw == user or author_display == user
+    can_edit = role in {"admin", "editor"} or author_raw == user or author_display == user
+    can_pin = role in {"admin", "editor"}
+
+    is_mine = author_raw == user or author_display == user
+    seen_names = tuple(people.get(reader) or reader for reader in readers_of(read_marks, msg) if reader != author_raw)
+
+    st.markdown(
+        _card_html(
+            str(msg_id),
+            str(msg.get("updated_at") or ""),
+            _message_text(msg),
+            message_timestamp(msg),
+            author_display,
+            bool(msg.get("pinned")),
+            is_mine,
+            _reaction_key(msg),
+            user,
+            seen_names[:6],
+        ),
+        unsafe_allow_html=True,
+    )
+    if archived:
+        # Archivsegmente sind unveränderlich.
+        return
+
+    action_cols = st.columns([1.0, 1.25, 1.0, 8.75])
+    with action_cols[0]:
+        with st.popover("😊", use_container_width=True):
+            st.caption("Reaktion auswählen")
+            cols = st.columns(len(REACTIONS))
+            for col, emoji in zip(cols, REACTIONS):
+                with col:
+                    if st.button(emoji, key=f"react_{trip_key}_{msg_id}_{emoji}", use_container_width=True):
+                        for real_msg in trip.get("messages", []):
+                            if real_msg.get("id") == msg_id:
+                                _toggle_reaction(real_msg, emoji, user)
+                                save_db(data)
+                                rerun_panel()
+    with action_cols[1]:
+        if can_edit:
+            with st.popover("✏️ Bearbeiten", use_container_width=True):
+                edit_text = st.text_area("Nachricht bearbeiten", value=_message_text(msg), key=f"edit_text_{trip_key}_{msg_id}")
+                if st.button("Änderung speichern", key=f"save_edit_{trip_key}_{msg_id}", use_container_width=True):
+                    for real_msg in trip.get("messages", []):
+                        if real_msg.get("id") == msg_id:
+                            real_msg["text"] = edit_text.strip()
+                            real_msg["updated_at"] = datetime.datetime.now().isoformat(timespec="microseconds")
+                            save_db(data)
+                            rerun_panel()
+    with action_cols[2]:
+        if can_pin:
+            pin_label = "📌 Lösen" if msg.get("pinned") else "📌 Pin"
+            if st.button(pin_label, key=f"pin_{trip_key}_{msg_id}", use_container_width=True):
+                for real_msg in trip.get("messages", []):
+                    if real_msg.get("id") == msg_id:
+                        real_msg["pinned"] = not bool(real_msg.get("pinned"))
+                        save_db(data)
+                        rerun_panel()
+    with action_cols[3]:
+        st.write("")
+    if can_delete:
+        delete_cols = st.columns([11.4, 0.6])
+        with delete_cols[1]:
+            if st.button("🗑️", key=f"delete_msg_{trip_key}_{msg_id}", help="Nachricht löschen", use_container_width=True):
+                trip["messages"] = [m for m in trip.get("messages", []) if m.get("id") != msg_id]
+                save_db(data)
+                rerun_panel()
+
+
+@st.fragment
+def render_chat(trip_key: str, user: str) -> None:
+    data, trip = load_panel(trip_key)
+    if trip is None:
+        st.error("Reise nicht gefunden.")
+        return
     participants = trip.setdefault("participants", {})
     role = participants.get(user, {}).get("role", "member")
-    messages = trip.setdefault("messages", [])
 
     _chat_styles()
 
-    if _mark_messages_as_seen(trip, user):
+    if mark_chat_read(trip, user):
         save_db(data)
+    # Erst nach dem Speichern: ein Merge kann neue Nachrichten gebracht haben.
+    messages = trip.setdefault("messages", [])
 
     toolbar_left, toolbar_right = st.columns([3.2, 1.2])
     with toolbar_left:
         st.markdown("<div class='ma-chat-search-wrap'>", unsafe_allow_html=True)
         search = st.text_input(
             "Suche im Chat",
-            placeholder="Nach Namen oder Text suchen ...",
+            placeholder="Nach Namen oder Wortanfängen suchen ...",
             key=f"chat_search_{trip_key}",
         )
         st.markdown("</div>", unsafe_allow_html=True)
@@ -280,126 +438,77 @@ def render_chat(data: dict, trip_key: str, user: str) -> None:
         with st.popover("Chat verwalten", use_container_width=True):
             st.caption("Nachrichten verwalten")
             if role == "admin":
+                if st.button("Alte Nachrichten archivieren", key=f"archive_chat_{trip_key}", use_container_width=True):
+                    if archive_trip(trip_key, trip):
+                        save_db(data)
+                    rerun_panel()
                 if st.button("Gesamten Chat leeren", key=f"clear_chat_{trip_key}", use_container_width=True):
                     trip["messages"] = []
+                    trip.pop("archive", None)
                     save_db(data)
-                    st.rerun()
+                    rerun_panel()
             st.caption(f"Deine Rolle: {role}")
 
-    filtered_messages = list(messages)
+    people = _participant_index(participants)
+    read_marks = chat_read_marks(trip)
+    window_key = f"chat_window_{trip_key}"
+    window = st.session_state.setdefault(window_key, CHAT_WINDOW)
+    archive_key = f"chat_archive_{trip_key}"
+    archived = archived_count(trip)
+    archived_ids: set = set()
     if search.strip():
-        q = search.strip().lower()
-        filtered_messages = [
-            msg for msg in filtered_messages
-            if q in _display_author(msg, participants).lower() or q in _message_text(msg).lower()
-        ]
+        hits = search_messages(trip_key, trip, search, people)
+        if archived:
+            archived_hits = search_archived(trip_key, trip, search, people)
+            archived_ids = {msg.get("id") for msg in archived_hits}
+            hits = archived_hits + hits
+        pinned = sorted((msg for msg in hits if msg.get("pinned")), key=message_timestamp)
+        unpinned = [msg for msg in hits if not msg.get("pinned")]
+        timeline = sorted(unpinned[-window:], key=message_timestamp)
+        has_older = len(unpinned) > window
+    else:
+        pinned = sorted((msg for msg in messages if msg.get("pinned")), key=message_timestamp)
+        source = messages
+        if archived and st.session_state.get(archive_key):
+            # Das Archiv wird erst gelesen, wenn jemand so weit zurückblättert.
+            older = load_archived(trip_key, trip)
+            archived_ids = {msg.get("id") for msg in older}
+            source = older + messages
+        timeline, has_older = _latest_messages(source, window)
     if only_pinned:
-        filtered_messages = [msg for msg in filtered_messages if msg.get("pinned")]
+        timeline, has_older = [], False
 
-    filtered_messages.sort(
-        key=lambda m: (
-            0 if m.get("pinned") else 1,
-            _message_timestamp(m),
-        ),
-        reverse=False,
-    )
-
-    if not filtered_messages:
+    if not pinned and not timeline:
         st.markdown(
             "<div class='ma-chat-empty'>Noch keine Nachrichten für die aktuelle Ansicht vorhanden.</div>",
             unsafe_allow_html=True,
         )
-    else:
+
+    if pinned:
+        st.markdown("**📌 Angepinnt**")
+        st.markdown("<div class='ma-chat-shell'>", unsafe_allow_html=True)
+        for idx, msg in enumerate(pinned):
+            _render_message(data, trip, trip_key, msg, f"p{idx}", user, role, people, read_marks)
+        st.markdown("</div>", unsafe_allow_html=True)
+        if timeline:
+            st.divider()
+
+    if has_older:
+        if st.button("⬆️ Ältere Nachrichten laden", key=f"chat_older_{trip_key}", use_container_width=True):
+            st.session_state[window_key] = window + CHAT_WINDOW
+            rerun_panel()
+    elif archived and not search.strip() and not only_pinned and not st.session_state.get(archive_key):
+        if st.button(f"🗄️ Archiv laden ({archived} Nachrichten)", key=f"chat_load_archive_{trip_key}", use_container_width=True):
+            st.session_state[archive_key] = True
+            st.session_state[window_key] = window + CHAT_WINDOW
+            rerun_panel()
+    if timeline:
         st.markdown("<div class='ma-chat-shell'>", unsafe_allow_html=True)
-        for idx, msg in enumerate(filtered_messages):
-            msg_id = msg.get("id") or f"{idx}"
-            author_raw = _raw_message_author(msg)
-            author_display = _display_author(msg, participants)
-            can_delete = role == "admin" or author_raw == user or author_display == user
-            can_edit = role in {"admin", "editor"} or author_raw == user or author_display == user
-            can_pin = role in {"admin", "editor"}
-
-            is_mine = author_raw == user or author_display == user
-            summary = _reaction_summary_html(msg, user)
-            safe_author = html.escape(author_display)
-            safe_text = html.escape(_message_text(msg)).replace("\n", "<br>")
-            pin_marker = "📌 " if msg.get("pinned") else ""
-            avatar = html.escape(_avatar_text(author_display))
-            mine_class = " mine" if is_mine else ""
-
-            seen_names = []
-            for seen_user in msg.get("read_by", []):
-                meta = participants.get(seen_user, {})
-                seen_names.append(meta.get("display_name") or seen_user)
-
-            seen_html = ""
-            if seen_names:
-                seen_html = f"<div class='ma-chat-seen'>Gelesen von: {html.escape(', '.join(seen_names[:6]))}</div>"
-
-            st.markdown(
-                (
-                    f"<div class='ma-chat-card{mine_class}'>"
-                    "<div class='ma-chat-head'>"
-                    "<div class='ma-chat-person'>"
-                    f"<div class='ma-chat-avatar'>{avatar}</div>"
-                    "<div class='ma-chat-namewrap'>"
-                    f"<div class='ma-chat-name'>{pin_marker}{safe_author}</div>"
-                    f"<div class='ma-chat-sub'>{_format_ts(_message_timestamp(msg))}</div>"
-                    "</div>"
-                    "</div>"
-                    "</div>"
-                    f"<div class='ma-chat-text'>{safe_text}</div>"
-                    f"{summary}"
-                    "<div class='ma-chat-meta'>"
-                    f"{seen_html or '<div></div>'}"
-                    "</div>"
-                    "</div>"
-                ),
-                unsafe_allow_html=True,
+        for idx, msg in enumerate(timeline):
+            _render_message(
+                data, trip, trip_key, msg, f"{idx}", user, role, people, read_marks,
+                archived=msg.get("id") in archived_ids,
             )
-
-            action_cols = st.columns([1.0, 1.25, 1.0, 8.75])
-            with action_cols[0]:
-                with st.popover("😊", use_container_width=True):
-                    st.caption("Reaktion auswählen")
-                    cols = st.columns(len(REACTIONS))
-                    for col, emoji in zip(cols, REACTIONS):
-                        with col:
-                            if st.button(emoji, key=f"react_{trip_key}_{msg_id}_{emoji}", use_container_width=True):
-                                for real_msg in trip.get("messages", []):
-                                    if real_msg.get("id") == msg_id:
-                                        _toggle_reaction(real_msg, emoji, user)
-                                        save_db(data)
-                                        st.rerun()
-            with action_cols[1]:
-                if can_edit:
-                    with st.popover("✏️ Bearbeiten", use_container_width=True):
-                        edit_text = st.text_area("Nachricht bearbeiten", value=_message_text(msg), key=f"edit_text_{trip_key}_{msg_id}")
-                        if st.button("Änderung speichern", key=f"save_edit_{trip_key}_{msg_id}", use_container_width=True):
-                            for real_msg in trip.get("messages", []):
-                                if real_msg.get("id") == msg_id:
-                                    real_msg["text"] = edit_text.strip()
-                                    real_msg["updated_at"] = datetime.datetime.now().isoformat(timespec="minutes")
-                                    save_db(data)
-                                    st.rerun()
-            with action_cols[2]:
-                if can_pin:
-                    pin_label = "📌 Lösen" if msg.get("pinned") else "📌 Pin"
-                    if st.button(pin_label, key=f"pin_{trip_key}_{msg_id}", use_container_width=True):
-                        for real_msg in trip.get("messages", []):
-                            if real_msg.get("id") == msg_id:
-                                real_msg["pinned"] = not bool(real_msg.get("pinned"))
-                                save_db(data)
-                                st.rerun()
-            with action_cols[3]:
-                st.write("")
-            if can_delete:
-                delete_cols = st.columns([11.4, 0.6])
-                with delete_cols[1]:
-                    if st.button("🗑️", key=f"delete_msg_{trip_key}_{msg_id}", help="Nachricht löschen", use_container_width=True):
-                        trip["messages"] = [m for m in trip.get("messages", []) if m.get("id") != msg_id]
-                        save_db(data)
-                        st.rerun()
         st.markdown("</div>", unsafe_allow_html=True)
 
     can_post = role in {"admin", "editor", "member"}
@@ -424,14 +533,14 @@ def render_chat(data: dict, trip_key: str, user: str) -> None:
                             "created_by": user,
                             "display_name": participants.get(user, {}).get("display_name") or user,
                             "text": text.strip(),
-                            "created_at": datetime.datetime.now().isoformat(timespec="minutes"),
+                            "created_at": datetime.datetime.now().isoformat(timespec="microseconds"),
                             "reactions": {},
-                            "read_by": [user],
                             "pinned": False,
                         }
                     )
+                    mark_chat_read(trip, user)
                     save_db(data)
-                    st.rerun()
+                    rerun_panel()
                 else:
                     st.warning("Bitte zuerst eine Nachricht eingeben.")
     else:
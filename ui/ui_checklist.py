@@ -6,6 +6,7 @@ from io import BytesIO
 import streamlit as st
 
 from core.storage import new_id, save_db
+from ui.fragments import load_panel, rerun_panel
 
 try:
     from reportlab.lib import colors
@@ -202,8 +203,12 @@ def _generate_checklist_pdf(trip_name: str, selected_person: str, selected_categ
     return buffer.getvalue()
 
 
-def render_checklist(data: dict, trip_key: str, user: str) -> None:
-    trip = data["trips"][trip_key]
+@st.fragment
+def render_checklist(trip_key: str, user: str) -> None:
+    data, trip = load_panel(trip_key)
+    if trip is None:
+        st.error("Reise nicht gefunden.")
+        return
     tasks = trip.setdefault("tasks", [])
     participants = trip.setdefault("participants", {})
     role = participants.get(user, {}).get("role", "member")
@@ -229,7 +234,7 @@ def render_checklist(data: dict, trip_key: str, user: str) -> None:
             st.caption("Schnelle Startvorlagen")
             for template_name, items in TEMPLATES.items():
                 if st.button(template_name, key=f"tpl_{trip_key}_{template_name}", use_container_width=True):
-                    now = datetime.datetime.now().isoformat(timespec="minutes")
+                    now = datetime.datetime.now().isoformat(timespec="microseconds")
                     for item_text, category in items:
                         trip["tasks"].append(
                             {
@@ -246,7 +251,7 @@ def render_checklist(data: dict, trip_key: str, user: str) -> None:
                             }
                         )
                     save_db(data)
-                    st.rerun()
+                    rerun_panel()
     with export_col2:
         if canvas is None:
             st.info("PDF-Export benötigt reportlab.")
@@ -274,7 +279,7 @@ def render_checklist(data: dict, trip_key: str, user: str) -> None:
 
             if st.button("Hinzufügen", key=f"checklist_add_button_{trip_key}", use_container_width=False):
                 if item_text.strip():
-                    now = datetime.datetime.now().isoformat(timespec="minutes")
+                    now = datetime.datetime.now().isoformat(timespec="microseconds")
                     trip["tasks"].append(
                         {
                             "id": new_id("task"),
@@ -290,7 +295,7 @@ def render_checklist(data: dict, trip_key: str, user: str) -> None:
                         }
                     )
                     save_db(data)
-                    st.rerun()
+                    rerun_panel()
                 else:
                     st.warning("Bitte zuerst einen Eintrag eingeben.")
 
@@ -314,10 +319,10 @@ def render_checklist(data: dict, trip_key: str, user: str) -> None:
                     if real_task.get("id") == task_id:
                         real_task["done"] = checked
                         real_task["updated_by"] = user
-                        real_task["updated_at"] = datetime.datetime.now().isoformat(timespec="minutes")
+                        real_task["updated_at"] = datetime.datetime.now().isoformat(timespec="microseconds")
                         break
                 save_db(data)
-                st.rerun()
+                rerun_panel()
 
         with row[1]:
             if role in {"admin", "editor"} or task.get("created_by") == user:
@@ -328,14 +333,14 @@ def render_checklist(data: dict, trip_key: str, user: str) -> None:
                             if real_task.get("id") == task_id:
                                 real_task["text"] = edit_text.strip() or _task_text(task)
                                 real_task["updated_by"] = user
-                                real_task["updated_at"] = datetime.datetime.now().isoformat(timespec="minutes")
+                                real_task["updated_at"] = datetime.datetime.now().isoformat(timespec="microseconds")
                                 break
                         save_db(data)
-                        st.rerun()
+                        rerun_panel()
 
         with row[2]:
             can_delete = role in {"admin", "editor"} or task.get("created_by") == user or user in task.get("assignees", [])
             if can_delete and st.button("🗑️", key=f"delete_task_{trip_key}_{task_id}", use_container_width=True):
                 trip["tasks"] = [t for t in trip.get("tasks", []) if t.get("id") != task_id]
                 save_db(data)
-                st.rerun()
+                rerun_panel()
@@ -7,6 +7,7 @@ from io import StringIO
 import streamlit as st
 
 from core.storage import new_id, save_db
+from ui.fragments import load_panel
 
 CATEGORIES = ["Allgemein", "Transport", "Essen", "Unterkunft", "Freizeit"]
 
@@ -65,8 +66,12 @@ def _csv_export(expenses: list[dict]) -> str:
     return output.getvalue()
 
 
-def render_costs(data: dict, trip_key: str, user: str):
-    trip = data["trips"][trip_key]
+@st.fragment
+def render_costs(trip_key: str, user: str):
+    data, trip = load_panel(trip_key)
+    if trip is None:
+        st.error("Reise nicht gefunden.")
+        return
     participants_meta = trip.get("participants", {})
     role = participants_meta.get(user, {}).get("role", "member")
     participants = sorted(list(participants_meta.keys()))
@@ -101,6 +106,7 @@ def render_costs(data: dict, trip_key: str, user: str):
                         "created_at": datetime.datetime.now().replace(microsecond=0).isoformat(),
                     })
                     save_db(data)
+                    # Ganze App neu ausführen: die Anzahl im Menü ändert sich.
                     st.rerun()
 
     if not expenses:
@@ -1,18 +1,34 @@
 import datetime
 import streamlit as st
-from core.utils import convert_to_webp
+from core.blobstore import blob_store, image_bytes
+from core.images import iter_renditions, rotation, view_bytes
 from core.storage import save_db
-from io import BytesIO
-import base64
-from PIL import Image
+from ui.fragments import load_panel, rerun_panel
 import uuid
 
-def render_photos(data, trip_name):
-    if "trips" not in data or trip_name not in data["trips"]:
+@st.dialog("📸 Foto", width="large")
+def _show_photo(img):
+    # Anzeigefassung und Original werden erst beim Öffnen geladen.
+    data_bytes = view_bytes(img)
+    if data_bytes is None:
+        st.warning("Bild nicht gefunden.")
+        return
+    st.image(data_bytes)
+    if img.get("caption"):
+        st.caption(f"💬 {img['caption']}")
+    if img.get("original"):
+        original = image_bytes(img, "original")
+        if original is not None:
+            st.download_button("⬇️ Original herunterladen", original, file_name=img.get("name") or img.get("id", "foto"), use_container_width=True)
+
+
+@st.fragment
+def render_photos(trip_name):
+    data, trip = load_panel(trip_name)
+    if trip is None:
         st.error("Reise nicht gefunden.")
         return
-        
-    trip = data["trips"][trip_name]
+
     if "images" not in trip:
         trip["images"] = []
 
@@ -22,30 +38,43 @@ def render_photos(data, trip_name):
     with st.expander("📤 Neue Fotos hochladen"):
         uploaded = st.file_uploader("Bilder wählen", type=["jpg", "jpeg", "png"], accept_multiple_files=True)
         
+        failed = st.session_state.pop("photo_upload_failed", None)
+        if failed:
+            st.warning(f"Nicht lesbar: {', '.join(failed)}")
+
         if st.button("Hochladen & Optimieren", key="upload_btn"):
             if uploaded:
-                with st.spinner("Bilder werden verarbeitet..."):
-                    for file in uploaded:
-                        # Bild öffnen und skalieren (um JSON klein zu halten)
-                        img = Image.open(file)
-                        max_size = (1024, 1024) # Max 1024px Breite/Höhe
-                        img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                        
-                        # In WebP umwandeln
-                        buf = BytesIO()
-                        img.save(buf, format="WEBP", quality=70)
-                        webp_bytes = buf.getvalue()
-
-                        unique_id = f"img_{uuid.uuid4().hex[:8]}"
+                progress = st.progress(0.0, text=f"0/{len(uploaded)} Bilder verarbeitet")
+                sources = ((pos, file.getvalue()) for pos, file in enumerate(uploaded))
 
-                        trip["images"].append({
-                            "id": unique_id,
-                            "data": base64.b64encode(webp_bytes).decode(),
+                # Original behalten, dazu Anzeige- (1024px) und Vorschaufassung als WebP.
+                # Das Original kommt erst in den Blob-Speicher, wenn es lesbar war.
+                added = {}
+                failed = []
+                for done, (pos, versions) in enumerate(iter_renditions(sources), start=1):
+                    if isinstance(versions, Exception):
+                        failed.append(uploaded[pos].name)
+                    else:
+                        added[pos] = {
+                            "id": f"img_{uuid.uuid4().hex[:8]}",
+                            "blob": blob_store().put(versions["display"]),
+                            "thumb": blob_store().put(versions["thumb"]),
+                            "original": blob_store().put(uploaded[pos].getvalue()),
+                            "name": uploaded[pos].name,
+                            "size": len(versions["display"]),
                             "caption": "",
                             "date": datetime.datetime.now().strftime("%d.%m.%Y %H:%M")
-                        })
+                        }
+                    progress.progress(done / len(uploaded), text=f"{done}/{len(uploaded)} Bilder verarbeitet")
+
+                # Reihenfolge der Auswahl beibehalten, einmal speichern.
+                trip["images"].extend(added[pos] for pos in sorted(added))
+                if failed:
+                    st.session_state["photo_upload_failed"] = failed
+                if added:
                     save_db(data)
-                    st.success(f"{len(uploaded)} Bilder hinzugefügt!")
+                    st.success(f"{len(added)} Bilder hinzugefügt!")
+                    # Ganze App neu ausführen: die Anzahl im Menü ändert sich.
                     st.rerun()
 
     st.divider()
@@ -62,11 +91,17 @@ def render_photos(data, trip_name):
             
             with cols[i % 2]:
                 try:
-                    data_bytes = base64.b64decode(img["data"])
-                    st.image(data_bytes)
+                    # Im Raster nur die kleine Vorschau; groß erst auf Klick.
+                    thumb_bytes = view_bytes(img, "thumb")
+                    if thumb_bytes is None:
+                        st.warning("Bild nicht gefunden.")
+                        continue
+                    st.image(thumb_bytes)
                     
                     if img.get("caption"):
                         st.caption(f"💬 {img['caption']}")
+                    if st.button("🔍 Groß anzeigen", key=f"show_{img_id}", use_container_width=True):
+                        _show_photo(img)
 
                     with st.expander("⚙️ Optionen"):
                         # Bildunterschrift
@@ -74,23 +109,21 @@ def render_photos(data, trip_name):
                         if new_cap != img.get("caption"):
                             img["caption"] = new_cap
                             save_db(data)
-                            st.rerun()
+                            rerun_panel()
 
                         c_rot, c_del = st.columns(2)
                         
-                        # Drehen
+                        # Drehen: nur die Ausrichtung wird gespeichert, die Bilddaten bleiben unverändert.
                         if c_rot.button("🔄 Drehen", key=f"rot_{img_id}"):
-                            im = Image.open(BytesIO(data_bytes)).rotate(-90, expand=True)
-                            buf = BytesIO()
-                            im.save(buf, format="WEBP", quality=75)
-                            img["data"] = base64.b64encode(buf.getvalue()).decode()
+                            img["rotation"] = (rotation(img) + 90) % 360
                             save_db(data)
-                            st.rerun()
+                            rerun_panel()
 
                         # Löschen (Gefestigte Logik)
                         if c_del.button("🗑️ Löschen", key=f"del_{img_id}"):
                             trip["images"] = [x for x in trip["images"] if x.get("id") != img_id]
                             save_db(data)
+                            # Ganze App neu ausführen: die Anzahl im Menü ändert sich.
                             st.rerun()
                             
                 except Exception as e: